@@ -21,32 +21,97 @@ Currently supported APIs includes:
 Usage: General: {cli} [--help|--refresh|--format (pretty|json)] your command and args --param value --param2 value2
        Get help on a specific path: {cli} your command --help
        Get help on a specific action: {cli} your command (list|show|update|create|delete) --help
+       Raw call on a known path: {cli} raw (GET|POST|PUT|DELETE) /api/path [--json '{{"param": "value"}}'] [--validate]
+       Same action on many IDs: {cli} bulk [--ids ID...|--ids-from FILE|--from-listing COMMAND] [--dry-run] -- your command with {{}} as ID
+       Local inventory snapshot: {cli} sync RESOURCE... [--stale-fraction 0.1]
+                                 {cli} query RESOURCE [--where key=value]
+       Shell completion: {cli} complete your command and the word to complete
 
 Note: if requested action conflicts with an API action the API action will be
       executed. To force the action, prefix it with 'do_'. Fo instance, 'list'
       becomes 'do_list'
 
+Note: in 'bulk' mode, '{{}}' in the command is replaced with each ID. See
+      '{cli} bulk --help' for concurrency, rate limit and resume options.
+
+Note: 'raw' mode never loads the command list. With '--validate', the call is
+      checked against a compact route index, built on first use.
+
+Note: 'sync' stores expanded top-level resources in a local SQLite database.
+      Later syncs only fetch new IDs and refresh the oldest known objects.
+      'query' and '--offline' read from it without calling the API.
+
+Note: 'complete' prints candidates for the last word, including IDs from the
+      parent listing and enum values. Listings are cached for 5 minutes. See
+      README for bash setup.
+
+Note: schemas and commands are cached in a store shared by all endpoints. Set
+      'OVH_CLI_STORE' to a common directory to share it between trusted
+      users. Stored objects get the permissions of this directory, make it
+      group writable and setgid, for instance 'chmod 2775'. When it is not
+      writable, objects are stored in the private cache instead.
+
 Top level options:
     --help      This message
-    --refresh   Rebuild available commands list and documentation
-    --format    Output format, can be 'pretty', 'json', 'yaml' or 'bash'. (default='pretty')
+    --refresh   Rebuild available commands list and documentation. Only resources
+                whose schema changed are rebuilt, changes are summarized
+    --format    Output format, can be 'pretty', 'json', 'yaml', 'bash', 'csv' or 'tsv'. (default='pretty')
     --debug     Print verbose debugging informations. Use it when reporting a bug
+    --wait      After a POST, PUT or DELETE, wait for the returned task(s) to
+                complete. Also applies to 'bulk' and '--on'. Exits non-zero
+                if a task fails or does not finish within '--wait-timeout'
+                seconds (default=3600)
+    --watch     Re-run a GET every INTERVAL seconds and only print changes.
+                Listings fetch added objects and refresh a quarter of known
+                ones per cycle, so a change shows within 4 cycles. On a
+                terminal, the view is redrawn in place.
+    --on        Run on comma separated 'endpoint[:profile]' targets concurrently,
+                for instance 'ovh-eu,ovh-ca:acme'. 'profile' is a section of
+                ovh.conf with its own credentials. Output is tagged by target.
+    --offline   Answer GET commands from the local 'sync' snapshot
+    --count     Count objects of a listing instead of printing them
+    --group-by  Count objects per FIELD value. Nested fields are dot separated,
+                for instance 'price.currencyCode'. May be repeated
+    --sum       Sum numeric FIELD over objects, per group. May be repeated
+    --metrics   Append request counts, latencies and sizes per route template
+                to FILE on exit. FILE ending with '.prom' is a cumulative
+                Prometheus textfile, otherwise json lines. Defaults to
+                'OVH_CLI_METRICS' environment variable, if set
 '''
 
-# TODO:
-#  - list / complete 'enum' arguments
-
 from __future__ import absolute_import
 
 import os
 import sys
+import json
+import time
+import atexit
+import shlex
+import argparse
 import ovh
 
-from ovhcli.utils import camel_to_snake
+from threading import Lock
+
+from ovhcli.utils import camel_to_snake, parse_filters, match_filters
 from ovhcli.schema import load_schemas, SCHEMAS_BASE_PATH, SCHEMAS
 from ovhcli.formater import formaters, get_formater
-from ovhcli.parser import ArgParser
+from ovhcli.parser import ArgParser, MODELS, register_models, get_resource_hash, diff_parsers
 from ovhcli.parser import ArgParserException, ArgParserTypeConflict, ArgParserUnknownRoute
+from ovhcli.routes import build_route_index, save_route_index, load_route_index, validate_call
+from ovhcli.routes import diff_route_index
+from ovhcli.multi import parse_targets, get_profile_credentials, fan_out, TargetException
+from ovhcli.bulk import parse_bulk_args, render_command, load_ids, run_bulk
+from ovhcli.expand import expand_listing
+from ovhcli.aggregate import aggregate
+from ovhcli.watch import watch
+from ovhcli.tasks import TaskWaiter, find_task_paths, DEFAULT_TIMEOUT
+from ovhcli.timedelta import load_time_delta, save_time_delta, clear_time_delta, is_time_error
+from ovhcli.memo import GetMemo
+from ovhcli.store import hash_content, load_object, save_object, save_schema
+from ovhcli.snapshot import Snapshot, SnapshotClient, get_snapshot_path
+from ovhcli.snapshot import parse_snapshot_args, resolve_resources
+from ovhcli.complete import CompletionCache, COMPLETION_TIMEOUT
+from ovhcli.metrics import Metrics
 
 try:
     import cPickle as pickle
@@ -55,21 +120,100 @@ except ImportError:
 
 from ovh.client import ENDPOINTS
 
-## overload ovh client to insert debug informations
+#: bump whenever the stored parser layout changes to invalidate old caches
+CACHE_VERSION = 6
+
+## overload ovh client to insert debug informations, cache time delta, memoize GETs and record metrics
 
 class OVHClient(ovh.Client):
-    def __init__(self, debug, *args, **kwargs):
-        super(OVHClient, self).__init__(*args, **kwargs)
+    #: shared by all clients, ``None`` when disabled
+    metrics = None
+
+    #: serializes time delta loads, so that concurrent first calls query it once
+    time_delta_lock = Lock()
+
+    def __init__(self, debug, endpoint, *args, **kwargs):
+        super(OVHClient, self).__init__(endpoint, *args, **kwargs)
         self.debug=debug
+        self.endpoint_name=endpoint
+        self._cached_time_delta=False
+        self.memo=GetMemo()
+
+        if debug:
+            atexit.register(self.print_memo_stats)
+
+    def print_memo_stats(self):
+        if self.memo is not None:
+            sys.stderr.write("%s: %s\n" % (self.endpoint_name, self.memo.get_stats()))
+
+    @property
+    def time_delta(self):
+        '''
+        Load time delta from disk cache. Query it from the API and cache it
+        when missing or expired.
+        '''
+        if self._time_delta is not None:
+            return self._time_delta
+
+        with self.time_delta_lock:
+            if self._time_delta is None:
+                self._time_delta = load_time_delta(self.endpoint_name)
+                self._cached_time_delta = self._time_delta is not None
+            if self._time_delta is None:
+                self._time_delta = super(OVHClient, self).time_delta
+                save_time_delta(self.endpoint_name, self._time_delta)
+            return self._time_delta
 
     def call(self, method, path, data=None, need_auth=True):
+        '''
+        Memoize GETs, if enabled. Mutations invalidate overlapping GETs.
+        '''
+        if self.memo is None:
+            return self.do_call(method, path, data, need_auth)
+
+        if method == 'GET':
+            return self.memo.get(path, lambda: self.do_call(method, path, data, need_auth))
+
+        try:
+            return self.do_call(method, path, data, need_auth)
+        finally:
+            self.memo.invalidate(path)
+
+    def raw_call(self, method, path, data=None, need_auth=True):
+        '''
+        Record metrics of each request actually sent.
+        '''
+        if self.metrics is None:
+            return super(OVHClient, self).raw_call(method, path, data, need_auth)
+
+        sent = len(json.dumps(data)) if data is not None else 0
+        start = time.time()
+        try:
+            response = super(OVHClient, self).raw_call(method, path, data, need_auth)
+        except Exception:
+            self.metrics.record(self.endpoint_name, method, path, time.time()-start, None, sent, 0)
+            raise
+        self.metrics.record(self.endpoint_name, method, path, time.time()-start,
+                            response.status_code, sent, len(response.content))
+        return response
+
+    def do_call(self, method, path, data=None, need_auth=True):
         debug = self.debug and path != "/auth/time"
 
         if debug:
             sys.stderr.write("%s, %s" % (method, path))
             if data:
                 sys.stderr.write("(%s)" % data)
-        data = super(OVHClient, self).call(method, path, data, need_auth)
+        try:
+            data = super(OVHClient, self).call(method, path, data, need_auth)
+        except ovh.exceptions.APIError as e:
+            # cached time delta may be stale: refresh it and try again, once
+            if not (need_auth and self._cached_time_delta and is_time_error(e)):
+                raise
+            clear_time_delta(self.endpoint_name)
+            self._time_delta = None
+            self._cached_time_delta = False
+            data = super(OVHClient, self).call(method, path, data, need_auth)
         if debug:
             if data:
                 sys.stderr.write(" --> %s" % data)
@@ -78,6 +222,74 @@ class OVHClient(ovh.Client):
 
 ## parser
 
+def get_subtree_key(resource_hash):
+    return hash_content(['parser', CACHE_VERSION, resource_hash])
+
+def load_subtree(resource_hash):
+    '''
+    :return: stored root command of a resource or ``None`` if missing
+    '''
+    data = load_object(get_subtree_key(resource_hash))
+    if data is None:
+        return None
+    try:
+        return ArgParser.from_data(data)
+    except ValueError:
+        return None
+
+def load_manifest(endpoint):
+    '''
+    Load endpoint cache manifest.
+
+    :return: ``{resourcePath: resource_hash}``, ``{schema name: key}`` or
+             ``None, None`` when missing or outdated
+    '''
+    try:
+        with open(SCHEMAS_BASE_PATH+endpoint, 'r') as f:
+            version, hashes, schema_keys = pickle.load(f)
+        if version == CACHE_VERSION:
+            return hashes, schema_keys
+    except:
+        pass
+    return None, None
+
+def load_parser(hashes):
+    '''
+    Assemble parser from stored command subtrees.
+
+    :return: parser or ``None`` if a subtree is missing from the store
+    '''
+    parser = ArgParser(None, None)
+    for resource_hash in hashes.itervalues():
+        api_parser = load_subtree(resource_hash)
+        if api_parser is None:
+            return None
+        parser.add_parser(api_parser)
+    return parser
+
+def build_resource_parser(schema):
+    '''
+    Build the root command of resource ``schema`` and all its subcommands.
+    Models must be registered first.
+    '''
+    base_path = schema['resourcePath']
+    api_parser = ArgParser(camel_to_snake(base_path[1:]), base_path[1:])
+
+    # add subcommands
+    for api in schema['apis']:
+        command_path = api['path'][len(base_path):]
+        command_parser = api_parser.ensure_path_parser(command_path, api['description'])
+
+        # add actions
+        for operation in api['operations']:
+            command_parser.register_http_verb(
+                    operation['httpMethod'],
+                    operation['parameters'],
+                    operation['description']
+            )
+
+    return api_parser
+
 def init_arg_parser(endpoint, refresh=False):
     '''
     Build command line parser from json and cache result on disk for faster
@@ -89,19 +301,21 @@ def init_arg_parser(endpoint, refresh=False):
 
     All command line arguments are converted to snake-case.
 
+    Raw schemas and root commands are kept in the shared store (see
+    ``ovhcli.store``), keyed by content. The endpoint cache is a manifest of
+    these keys. Only resources whose schema or models are not in the store yet
+    are built. On refresh, a summary of changed actions is printed.
+
     :param str endpoint: api endpoint name.
     :param boolean refresh: when ``True``, bypass cache, no matter its state.
     '''
 
-    cache_file = SCHEMAS_BASE_PATH+endpoint
-
     # First attempt to load parser from cache
-    try:
-        if not refresh:
-            with open(cache_file, 'r') as f:
-                return pickle.load(f)
-    except:
-        pass
+    old_hashes, schema_keys = load_manifest(endpoint)
+    if old_hashes is not None and not refresh:
+        parser = load_parser(old_hashes)
+        if parser is not None:
+            return parser
 
     # cache dir exists ?
     if not os.path.exists(SCHEMAS_BASE_PATH):
@@ -109,37 +323,353 @@ def init_arg_parser(endpoint, refresh=False):
 
     # get schemas
     load_schemas(ENDPOINTS[endpoint])
+    schema_keys = dict((name, save_schema(schema)) for name, schema in SCHEMAS.iteritems())
 
-    # Build parser
+    # models may be referenced from any resource, register them all first
+    MODELS.clear()
+    for schema in SCHEMAS.values():
+        register_models(schema.get('models', {}))
+
+    # Build parser, reusing stored root commands
     parser = ArgParser(None, None)
+    hashes = {}
+    subtrees = {}
+    rebuilt = 0
 
     for schema in SCHEMAS.values():
         if not 'resourcePath' in schema:
             continue
 
-        # add root command
-        base_path = schema['resourcePath']
-        api_cmd = camel_to_snake(base_path[1:])
-        api_parser = parser.ensure_parser(api_cmd, base_path[1:])
+        resource_hash = hashes[schema['resourcePath']] = get_resource_hash(schema)
+        api_parser = load_subtree(resource_hash)
+        if api_parser is None:
+            api_parser = build_resource_parser(schema)
+            save_object(get_subtree_key(resource_hash), api_parser.to_data())
+            rebuilt += 1
+        parser.add_parser(api_parser)
+        subtrees[schema['resourcePath']] = api_parser
+
+    # report changes. The route index only knows raw parameters, compiled
+    # actions of changed resources also tell model, enum and help changes
+    index = build_route_index(SCHEMAS.values())
+    if refresh and old_hashes is not None:
+        changes = set(diff_route_index(load_route_index(endpoint) or {}, index))
+        for resource_path, resource_hash in hashes.iteritems():
+            if old_hashes.get(resource_path, resource_hash) == resource_hash:
+                continue
+            old_parser = load_subtree(old_hashes[resource_path])
+            changes.update(change for change in diff_parsers(old_parser, subtrees[resource_path])
+                           if change[0] == '~')
+        changes = sorted(changes)
+        for change, verb, template in changes:
+            print "%s %-6s %s" % (change, verb, template)
+        print "%d action(s) changed, %d of %d resource(s) rebuilt" % (len(changes), rebuilt, len(hashes))
+
+    # save manifest and route index
+    with open(SCHEMAS_BASE_PATH+endpoint, 'w') as f:
+        pickle.dump((CACHE_VERSION, hashes, schema_keys), f, pickle.HIGHEST_PROTOCOL)
+    save_route_index(endpoint, index)
 
-        # add subcommands
-        for api in schema['apis']:
-            command_path = api['path'][len(base_path):]
-            command_parser = api_parser.ensure_path_parser(command_path, api['description'], schema)
+    return parser
 
-            # add actions
-            for operation in api['operations']:
-                command_parser.register_http_verb(
-                        operation['httpMethod'],
-                        operation['parameters'],
-                        operation['description']
-                )
+def init_route_index(endpoint):
+    '''
+    Load route index from cache. If missing, build it from the stored schemas
+    or download them, without building the full parser.
 
-    # cache resulting parser
-    with open(cache_file, 'w') as f:
-        pickle.dump(parser, f, pickle.HIGHEST_PROTOCOL)
+    :param str endpoint: api endpoint name.
+    '''
+    index = load_route_index(endpoint)
+    if index is not None:
+        return index
 
-    return parser
+    if not os.path.exists(SCHEMAS_BASE_PATH):
+        os.makedirs(SCHEMAS_BASE_PATH)
+
+    schema_keys = load_manifest(endpoint)[1] or {}
+    schemas = [load_object(key) for key in schema_keys.itervalues()]
+    if not schemas or None in schemas:
+        load_schemas(ENDPOINTS[endpoint])
+        schemas = SCHEMAS.values()
+
+    index = build_route_index(schemas)
+    save_route_index(endpoint, index)
+    return index
+
+def parse_raw_args(args):
+    '''
+    Parse 'raw' mode arguments: ``METHOD /path [--json body] [--validate]``
+
+    :return: verb, path, body, validate
+    '''
+    parser = argparse.ArgumentParser(os.path.basename(sys.argv[0])+' raw')
+    parser.add_argument('method', type=str.upper, choices=['GET', 'POST', 'PUT', 'DELETE'])
+    parser.add_argument('path', help="full API path, for instance '/domain/zone/example.com/record'")
+    parser.add_argument('--json', dest='body', type=json.loads, default={},
+                        help='request parameters, as a json object')
+    parser.add_argument('--validate', action='store_true',
+                        help='check route and parameters against the API schema')
+    arguments = parser.parse_args(args)
+
+    if not arguments.path.startswith('/'):
+        parser.error("path must start with '/'")
+    if not isinstance(arguments.body, dict):
+        parser.error('--json must be a json object')
+    if arguments.method == 'DELETE' and arguments.body:
+        parser.error('DELETE does not accept parameters')
+
+    return arguments.method, arguments.path, arguments.body, arguments.validate
+
+def parse_command(endpoint, args, options):
+    '''
+    Parse command line ``args`` for ``endpoint``. Exits on error or when help
+    was requested.
+
+    :return: verb, path, arguments
+    '''
+    if args and args[0] == 'raw':
+        # raw mode: we already know the path, do not even load the parser
+        verb, method, arguments, validate = parse_raw_args(args[1:])
+
+        if validate:
+            try:
+                validate_call(init_route_index(endpoint), verb, method, arguments)
+            except ArgParserException as e:
+                print e
+                sys.exit(1)
+    else:
+        # create argument parser
+        parser = init_arg_parser(endpoint, options['refresh'])
+
+        if options['help']:
+            do_usage()
+            print parser.get_help_message()
+            sys.exit(1)
+
+        # Ensure enough arguments
+        if not args:
+            do_usage()
+            sys.exit(1)
+
+        try:
+            verb, method, arguments = parser.parse('', args)
+        except ArgParserUnknownRoute as e:
+            print e
+            sys.exit(1)
+
+        if verb is None:
+            # abort
+            sys.exit(0)
+
+        arguments = arguments.__dict__
+
+    return verb, method, arguments
+
+def do_fan_out(spec, args, options):
+    '''
+    Run the command on all targets of ``spec`` concurrently, each with its own
+    parser and client. Results are merged and tagged by target.
+
+    :return: exit code
+    '''
+    try:
+        targets = parse_targets(spec)
+    except TargetException as e:
+        print >>sys.stderr, e
+        return 1
+
+    # schemas and models are global: load parsers one endpoint at a time
+    commands = {}
+    for tag, endpoint, profile in targets:
+        if endpoint not in commands:
+            commands[endpoint] = parse_command(endpoint, list(args), options)
+
+    def run(endpoint, profile):
+        verb, method, arguments = commands[endpoint]
+        credentials = get_profile_credentials(profile) if profile else {}
+        client = OVHClient(options['debug'], endpoint, **credentials)
+        return client, getattr(client, verb.lower())(method, **arguments)
+
+    status = 0
+    results = []
+    jobs = [(tag, lambda endpoint=endpoint, profile=profile: run(endpoint, profile))
+            for tag, endpoint, profile in targets]
+    for tag, result, error in fan_out(jobs):
+        if error is not None:
+            print >>sys.stderr, '%s: %s' % (tag, error)
+            status = 1
+        else:
+            results.append((tag,) + result)
+
+    verb, method = commands[targets[0][1]][:2]
+    get_formater(options['format']).print_tagged(verb, method, results)
+
+    if options['wait'] and verb != 'GET':
+        endpoints = dict((tag, endpoint) for tag, endpoint, profile in targets)
+        status |= wait_tasks([(tag, client, endpoints[tag], method, data)
+                              for tag, client, data in results], options)
+    return status
+
+def do_bulk(endpoint, args, options):
+    '''
+    Run the command template in ``args`` for many IDs. See ``ovhcli.bulk``.
+
+    :return: exit code
+    '''
+    bulk_options, template = parse_bulk_args(os.path.basename(sys.argv[0])+' bulk', args)
+    parser = init_arg_parser(endpoint, options['refresh'])
+    client = OVHClient(options['debug'], endpoint)
+
+    try:
+        filters = parse_filters(bulk_options.where)
+        ids = load_ids(bulk_options.ids, bulk_options.ids_from)
+
+        if bulk_options.from_listing:
+            verb, method, arguments = parser.parse('', shlex.split(bulk_options.from_listing))
+            if verb != 'GET':
+                raise ArgParserException('--from-listing must be a listing command')
+            listing = client.get(method, **arguments.__dict__)
+            if filters:
+                listing = [elem for elem, line in expand_listing(client, method, listing)
+                           if match_filters(line, filters)]
+            ids += [elem for elem in listing if elem not in ids]
+    except Exception as e:
+        print e
+        if options['debug']:
+            raise
+        return 1
+
+    # parse all calls upfront: a bad template fails before any change is made
+    calls = []
+    for item in ids:
+        try:
+            verb, method, arguments = parser.parse('', render_command(template, item))
+        except ArgParserUnknownRoute as e:
+            print e
+            return 1
+        if verb is None:
+            return 0
+        calls.append((item, (verb, method, arguments.__dict__)))
+
+    results, status = run_bulk(client, calls,
+                               concurrency=bulk_options.concurrency,
+                               rate=bulk_options.rate,
+                               state=bulk_options.state,
+                               dry_run=bulk_options.dry_run)
+
+    if options['wait'] and not bulk_options.dry_run:
+        methods = dict((item, call[1]) for item, call in calls)
+        status |= wait_tasks([(item, client, endpoint, methods[item], data)
+                              for item, data in results], options)
+    return status
+
+def do_snapshot(endpoint, command, args, options):
+    '''
+    'sync' top-level resources into the local snapshot or 'query' it. See
+    ``ovhcli.snapshot``.
+
+    :return: exit code
+    '''
+    snapshot_options = parse_snapshot_args(os.path.basename(sys.argv[0]), command, args)
+    parser = init_arg_parser(endpoint, options['refresh'])
+    snapshot = Snapshot(snapshot_options.db or get_snapshot_path(endpoint))
+
+    try:
+        paths = resolve_resources(parser, snapshot_options.resources)
+
+        if command == 'query':
+            filters = parse_filters(snapshot_options.where)
+            results = [(path, None, snapshot.query(path, filters)) for path in paths]
+            if len(results) == 1:
+                get_formater(options['format']).print_data(None, 'GET', paths[0], results[0][2])
+            else:
+                get_formater(options['format']).print_tagged('GET', paths[0], results)
+            return 0
+
+        client = OVHClient(options['debug'], endpoint)
+        status = 0
+        for path in paths:
+            errors = []
+            counts = snapshot.sync(client, path, snapshot_options.stale_fraction, errors)
+            for elem, error in errors:
+                print >>sys.stderr, (u'%s/%s: %s' % (path, elem, error)).encode('utf-8')
+            print >>sys.stderr, '%s: %d added, %d removed, %d refreshed, %d unchanged, %d failed' % ((path,) + counts)
+            if errors:
+                status = 1
+        return status
+    except Exception as e:
+        print e
+        if options['debug']:
+            raise
+        return 1
+    finally:
+        snapshot.close()
+
+#: top level options followed by a value
+VALUE_OPTIONS = ['--format', '--on', '--wait-timeout', '--watch', '--group-by', '--sum', '--metrics']
+
+#: commands not part of the API
+SPECIAL_COMMANDS = ['bulk', 'complete', 'query', 'raw', 'sync']
+
+def do_complete(endpoint, args, options):
+    '''
+    Print completion candidates for the last word of ``args``, one per line.
+
+    :return: exit code
+    '''
+    # skip top level options
+    args = list(args) or ['']
+    while len(args) > 1 and args[0].startswith('--'):
+        if args.pop(0) in VALUE_OPTIONS and len(args) > 1:
+            args.pop(0)
+
+    # a first run may download schemas: keep progress out of the candidates
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        parser = init_arg_parser(endpoint, options['refresh'])
+    finally:
+        sys.stdout = stdout
+
+    cache = CompletionCache(endpoint)
+    clients = []
+
+    def get_values(path):
+        if not clients:
+            clients.append(OVHClient(False, endpoint, timeout=COMPLETION_TIMEOUT))
+        return cache.get(path, lambda: clients[0].get(path))
+
+    if len(args) > 1 and args[0] in ('sync', 'query'):
+        candidates = sorted(name for name in parser._routes if name and name.startswith(args[-1]))
+    elif len(args) > 1 and args[0] in SPECIAL_COMMANDS:
+        candidates = []
+    else:
+        candidates = parser.complete('', args, get_values)
+        if len(args) == 1:
+            candidates = sorted(candidates + [name for name in SPECIAL_COMMANDS if name.startswith(args[0])])
+
+    cache.save()
+    for candidate in candidates:
+        print candidate.encode('utf-8')
+    return 0
+
+def wait_tasks(jobs, options):
+    '''
+    Wait for all tasks returned by mutations, in a single scheduler.
+
+    :param jobs: list of ``(label, client, endpoint, method, result)``
+    :return: exit code
+    '''
+    waiter = TaskWaiter(options['wait_timeout'])
+    for label, client, endpoint, method, data in jobs:
+        # each poll must hit the API
+        client.memo = None
+        for path in find_task_paths(init_route_index(endpoint), method, data):
+            waiter.add(label, client, path)
+
+    if not waiter:
+        print >>sys.stderr, 'No task to wait for'
+        return 0
+    return waiter.run()
 
 def do_usage():
     print sys.modules[__name__].__doc__.format(cli=sys.argv[0])
@@ -150,6 +680,15 @@ if __name__ == '__main__':
         'refresh': False,
         'help': False,
         'format': 'terminal', # or 'json'
+        'on': None,
+        'watch': None,
+        'wait': False,
+        'wait_timeout': DEFAULT_TIMEOUT,
+        'offline': False,
+        'count': False,
+        'group_by': [],
+        'sum': [],
+        'metrics': os.environ.get('OVH_CLI_METRICS'),
     }
 
     # load and validate endpoint name from cli name
@@ -176,34 +715,101 @@ if __name__ == '__main__':
             if options['format'] not in formaters:
                 print >>sys.stderr, 'Invalid format %s, expected one of %s' % (options['format'], ', '.join(formaters.keys()))
                 sys.exit(1)
+        if arg == '--on':
+            try: options['on'] = args.pop(0)
+            except IndexError: pass
+        if arg == '--wait':
+            options['wait'] = not options['wait']
+        if arg == '--wait-timeout':
+            try: options['wait_timeout'] = float(args.pop(0))
+            except (IndexError, ValueError):
+                print >>sys.stderr, '--wait-timeout expects a duration, in seconds'
+                sys.exit(1)
+        if arg == '--watch':
+            try: options['watch'] = float(args.pop(0))
+            except (IndexError, ValueError):
+                options['watch'] = None
+            if options['watch'] is None or options['watch'] <= 0:
+                print >>sys.stderr, '--watch expects a positive interval, in seconds'
+                sys.exit(1)
+        if arg == '--offline':
+            options['offline'] = not options['offline']
+        if arg == '--count':
+            options['count'] = not options['count']
+        if arg == '--metrics':
+            try: options['metrics'] = args.pop(0)
+            except IndexError:
+                print >>sys.stderr, '--metrics expects a file name'
+                sys.exit(1)
+        if arg in ('--group-by', '--sum'):
+            try: options[arg[2:].replace('-', '_')].append(args.pop(0))
+            except IndexError:
+                print >>sys.stderr, '%s expects a field name' % arg
+                sys.exit(1)
 
-    # create argument parser
-    parser = init_arg_parser(endpoint, options['refresh'])
+    if options['metrics']:
+        # never download schemas just to name routes
+        OVHClient.metrics = Metrics(load_route_index)
+        atexit.register(OVHClient.metrics.flush, options['metrics'])
 
-    if options['help']:
-        do_usage()
-        print parser.get_help_message()
-        sys.exit(1)
+    if options['on'] is not None:
+        if options['watch'] is not None:
+            print >>sys.stderr, '--watch can not be combined with --on'
+            sys.exit(1)
+        if options['count'] or options['group_by'] or options['sum']:
+            print >>sys.stderr, '--count, --group-by and --sum can not be combined with --on'
+            sys.exit(1)
+        sys.exit(do_fan_out(options['on'], args, options))
 
-    # Ensure enough arguments
-    if not args:
-        do_usage()
-        sys.exit(1)
+    if args and args[0] == 'bulk':
+        sys.exit(do_bulk(endpoint, args[1:], options))
 
-    try:
-        verb, method, arguments = parser.parse('', args)
-    except ArgParserUnknownRoute as e:
-        print e
-        sys.exit(1)
+    if args and args[0] == 'complete':
+        sys.exit(do_complete(endpoint, args[1:], options))
 
-    if verb is None:
-        # abort
-        sys.exit(0)
+    if args and args[0] in ('sync', 'query'):
+        sys.exit(do_snapshot(endpoint, args[0], args[1:], options))
 
-    client = OVHClient(options['debug'], endpoint)
+    verb, method, arguments = parse_command(endpoint, args, options)
+
+    if options['offline']:
+        client = SnapshotClient(Snapshot(get_snapshot_path(endpoint)))
+    else:
+        client = OVHClient(options['debug'], endpoint)
     formater = get_formater(options['format'])
+
+    if options['count'] or options['group_by'] or options['sum']:
+        if verb != 'GET':
+            print >>sys.stderr, '--count, --group-by and --sum only apply to listings (GET)'
+            sys.exit(1)
+        # objects are only seen once, do not keep them
+        client.memo = None
+        try:
+            data = client.get(method, **arguments)
+            formater.print_data(client, verb, method,
+                                aggregate(client, method, data, options['group_by'], options['sum']))
+        except Exception as e:
+            print e
+            if options['debug']:
+                raise
+            sys.exit(1)
+        sys.exit(0)
+
+    if options['watch'] is not None:
+        if verb != 'GET':
+            print >>sys.stderr, '--watch only applies to listings and objects (GET)'
+            sys.exit(1)
+        # each cycle must hit the API
+        client.memo = None
+        sys.exit(watch(client, formater, verb, method, arguments, options['watch']))
+
     try:
-        formater.do_format(client, verb, method, arguments.__dict__)
+        if options['wait'] and verb != 'GET':
+            data = getattr(client, verb.lower())(method, **arguments)
+            formater.print_data(client, verb, method, data)
+            sys.exit(wait_tasks([(endpoint, client, endpoint, method, data)], options))
+
+        formater.do_format(client, verb, method, arguments)
     except Exception as e:
         # print nice error message
         print e
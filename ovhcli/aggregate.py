@@ -0,0 +1,85 @@
+# -*- encoding: utf-8 -*-
+'''
+Streaming aggregation of listings: count objects, optionally grouped by
+fields, and sum numeric fields.
+
+Objects are consumed as they are fetched and only per group counters are
+kept, so memory does not depend on the number of objects.
+'''
+
+from collections import OrderedDict
+
+from ovhcli.expand import iter_expand_listing, is_id_listing
+from ovhcli.utils import get_field
+
+class Aggregate(object):
+    def __init__(self, group_by=None, sums=None):
+        '''
+        :param list group_by: fields to group on, dot separated for nested
+                              fields. All objects are one group when empty
+        :param list sums: numeric fields to sum, for instance 'price.value'
+        '''
+        self.group_by = group_by or []
+        self.sums = sums or []
+        self.groups = {} #: group key: [count, sum...]
+
+    def add(self, data):
+        key = tuple(get_group_value(get_field(data, field)) for field in self.group_by)
+        totals = self.groups.get(key)
+        if totals is None:
+            totals = self.groups[key] = [0] + [0]*len(self.sums)
+
+        totals[0] += 1
+        for i, field in enumerate(self.sums):
+            value = get_field(data, field)
+            if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+                totals[i+1] += value
+
+    def get_rows(self):
+        '''
+        :return: list of one ordered dict per group, sorted by group. Without
+                 groups, a single row, even when no object was added
+        '''
+        groups = self.groups
+        if not groups and not self.group_by:
+            groups = {(): [0] + [0]*len(self.sums)}
+
+        rows = []
+        for key in sorted(groups):
+            row = OrderedDict(zip(self.group_by, key))
+            row['count'] = groups[key][0]
+            for field, total in zip(self.sums, groups[key][1:]):
+                row['sum(%s)' % field] = total
+            rows.append(row)
+        return rows
+
+def get_group_value(value):
+    '''
+    Groups are keyed by scalar values. Nested values are rendered as text.
+    '''
+    if isinstance(value, (dict, list)):
+        return unicode(value)
+    return value
+
+def aggregate(client, method, data, group_by=None, sums=None):
+    '''
+    Aggregate listing ``data`` got from ``method``. ID listings are expanded
+    on the fly, unless only counted.
+
+    :return: aggregated rows, see ``Aggregate.get_rows``
+    :raise ValueError: when ``data`` is not a listing
+    '''
+    if isinstance(data, list) and not group_by and not sums:
+        return [OrderedDict([('count', len(data))])]
+
+    if is_id_listing('GET', data):
+        objects = (line for elem, line in iter_expand_listing(client, method, data))
+    elif isinstance(data, list):
+        objects = data
+    else:
+        raise ValueError('Only listings may be aggregated')
+
+    result = Aggregate(group_by, sums)
+    for line in objects:
+        result.add(line)
+    return result.get_rows()
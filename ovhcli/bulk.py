@@ -0,0 +1,227 @@
+# -*- encoding: utf-8 -*-
+'''
+Bulk mode: run the same action on many IDs with bounded concurrency, rate
+limiting, dry-run and resumable progress.
+
+The command is a template where '{}' is replaced with each ID. For instance:
+
+    bulk --ids-from records.txt -- domain zone example.com record {} delete
+'''
+
+import os
+import sys
+import time
+import random
+import argparse
+
+from threading import Thread, Lock
+from Queue import Queue, Empty
+
+from ovh.exceptions import APIError
+
+PLACEHOLDER = '{}'
+DEFAULT_CONCURRENCY = 10
+MAX_RETRIES = 5
+
+def parse_bulk_args(prog, args):
+    '''
+    Split bulk options from the command template. They are separated by '--'.
+
+    :return: options, command template
+    '''
+    parser = argparse.ArgumentParser(prog, usage='%(prog)s [options] -- command with {} placeholder')
+    parser.add_argument('--ids', nargs='+', default=[], metavar='ID', help='IDs to process')
+    parser.add_argument('--ids-from', metavar='FILE', help="read IDs from FILE, one per line. '-' for stdin")
+    parser.add_argument('--from-listing', metavar='COMMAND', help="take IDs from a listing command, for instance 'dedicated-server'")
+    parser.add_argument('--where', action='append', default=[], metavar='KEY=VALUE', help='only keep listed objects matching all filters')
+    parser.add_argument('--dry-run', action='store_true', help='print calls without running them')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='max concurrent requests (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=None, help='max requests per second')
+    parser.add_argument('--state', metavar='FILE', help='progress file. When resuming, successful IDs are skipped')
+
+    i = args.index('--') if '--' in args else len(args)
+    options = parser.parse_args(args[:i])
+    template = args[i+1:]
+
+    if not template:
+        parser.error("missing '--' and command template")
+
+    if not any(PLACEHOLDER in arg for arg in template):
+        parser.error("command template must contain a '%s' placeholder" % PLACEHOLDER)
+    if options.where and not options.from_listing:
+        parser.error('--where requires --from-listing')
+    if options.concurrency < 1:
+        parser.error('--concurrency must be at least 1')
+
+    return options, template
+
+def render_command(template, item):
+    '''
+    Replace placeholder with ``item``. Like command line arguments, rendered
+    arguments are utf-8 encoded strings.
+    '''
+    item = unicode(item).encode('utf-8')
+    return [arg.replace(PLACEHOLDER, item) for arg in template]
+
+def load_ids(ids, ids_from):
+    '''
+    Merge IDs from the command line and from ``ids_from`` file, if any. Order
+    is preserved and duplicates are removed. IDs are decoded as utf-8.
+    '''
+    ids = [item.decode('utf-8') for item in ids]
+    if ids_from == '-':
+        ids += [line.decode('utf-8').strip() for line in sys.stdin]
+    elif ids_from:
+        with open(ids_from, 'r') as f:
+            ids += [line.decode('utf-8').strip() for line in f]
+
+    seen = set()
+    return [item for item in ids if item and not (item in seen or seen.add(item))]
+
+class RateLimiter(object):
+    '''
+    Spaces requests by at least ``1/rate`` seconds, accross all workers. When
+    the API throttles us, all workers back off.
+    '''
+    def __init__(self, rate=None):
+        self.interval = 1.0/rate if rate else 0
+        self.next_slot = 0
+        self.lock = Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.time()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def backoff(self, delay):
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.time() + delay)
+
+class Progress(object):
+    '''
+    Append only progress file. Each line is 'ok<TAB>id' or
+    'fail<TAB>id<TAB>message'. The last status of an ID wins.
+    '''
+    def __init__(self, path=None, read_only=False):
+        '''
+        :param bool read_only: load progress from ``path`` but do not record
+                               anything to it
+        '''
+        self.done = set()
+        self.lock = Lock()
+        self.f = None
+
+        if not path:
+            return
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    fields = line.decode('utf-8').rstrip('\n').split('\t')
+                    if len(fields) < 2:
+                        continue
+                    if fields[0] == 'ok':
+                        self.done.add(fields[1])
+                    else:
+                        self.done.discard(fields[1])
+        if not read_only:
+            self.f = open(path, 'a')
+
+    def record(self, item, error=None):
+        with self.lock:
+            if error is None:
+                line = u'OK    %s' % item
+            else:
+                line = u'FAIL  %s: %s' % (item, error)
+            print line.encode('utf-8')
+            sys.stdout.flush()
+
+            if self.f is not None:
+                if error is None:
+                    self.f.write((u'ok\t%s\n' % item).encode('utf-8'))
+                else:
+                    self.f.write((u'fail\t%s\t%s\n' % (item, unicode(error).replace('\n', ' '))).encode('utf-8'))
+                self.f.flush()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+
+def is_throttled(error):
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code == 429
+
+def get_retry_delay(error, attempt):
+    '''
+    Honor 'Retry-After' when present, exponential backoff with jitter otherwise
+    '''
+    try:
+        return float(error.response.headers['Retry-After'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return 2**attempt + random.random()
+
+def call_with_retry(client, limiter, verb, method, arguments):
+    for attempt in xrange(MAX_RETRIES+1):
+        limiter.wait()
+        try:
+            return getattr(client, verb.lower())(method, **arguments)
+        except APIError as e:
+            if not is_throttled(e) or attempt == MAX_RETRIES:
+                raise
+            limiter.backoff(get_retry_delay(e, attempt))
+
+def run_bulk(client, calls, concurrency=DEFAULT_CONCURRENCY, rate=None, state=None, dry_run=False):
+    '''
+    Run all ``calls`` using a bounded pool of workers.
+
+    :param calls: list of ``(id, (verb, method, arguments))``
+    :return: list of ``(id, result)`` for successful calls and exit code
+    '''
+    progress = Progress(state, read_only=dry_run)
+    pending = Queue()
+    skipped = 0
+    for item, call in calls:
+        if unicode(item) in progress.done:
+            skipped += 1
+        else:
+            pending.put((item, call))
+
+    if dry_run:
+        while not pending.empty():
+            item, (verb, method, arguments) = pending.get()
+            print (u'DRY   %s: %s %s %s' % (item, verb, method, arguments or '')).encode('utf-8')
+        return [], 0
+
+    results = []
+    failures = []
+    limiter = RateLimiter(rate)
+
+    def work():
+        while True:
+            try:
+                item, (verb, method, arguments) = pending.get_nowait()
+            except Empty:
+                return
+            try:
+                results.append((item, call_with_retry(client, limiter, verb, method, arguments)))
+                progress.record(item)
+            except Exception as e:
+                failures.append(item)
+                progress.record(item, e)
+
+    threads = []
+    for i in xrange(min(pending.qsize(), concurrency)):
+        t = Thread(target=work)
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+    progress.close()
+
+    print >>sys.stderr, '%d succeeded, %d failed, %d skipped' % (len(results), len(failures), skipped)
+    return results, 1 if failures else 0
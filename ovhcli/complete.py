@@ -0,0 +1,72 @@
+# -*- encoding: utf-8 -*-
+'''
+Shell completion helpers.
+
+Valid values of path arguments, for instance '{serviceName}', are read from
+the parent listing. They are kept in a small per endpoint cache so that the
+API is queried at most once per ``COMPLETION_TTL`` for a given listing, even
+when the query failed.
+'''
+
+import os
+import json
+import time
+
+from ovhcli.schema import SCHEMAS_BASE_PATH
+
+COMPLETION_TTL = 300
+
+#: network timeout, in seconds. Completion must never hang the shell for long
+COMPLETION_TIMEOUT = 5
+
+def get_completion_cache_path(endpoint):
+    return SCHEMAS_BASE_PATH+endpoint+'.complete'
+
+class CompletionCache(object):
+    def __init__(self, endpoint, ttl=COMPLETION_TTL):
+        self.path = get_completion_cache_path(endpoint)
+        self.ttl = ttl
+        self.dirty = False
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f) #: path: [fetched_at, values]
+        except (IOError, ValueError):
+            self.entries = {}
+
+    def get(self, path, fetch):
+        '''
+        :param fetch: callable returning fresh values for listing ``path``
+        :return: cached values or fetched ones when missing or expired
+        '''
+        now = time.time()
+        entry = self.entries.get(path)
+        if entry is not None and now - entry[0] < self.ttl:
+            return entry[1]
+
+        try:
+            values = fetch()
+        except Exception:
+            values = []
+        if not isinstance(values, list):
+            values = []
+        values = [value for value in values if isinstance(value, (int, long, float, basestring))]
+
+        self.entries[path] = [now, values]
+        self.dirty = True
+        return values
+
+    def save(self):
+        if not self.dirty:
+            return
+
+        # drop expired entries
+        now = time.time()
+        entries = dict((path, entry) for path, entry in self.entries.iteritems()
+                       if now - entry[0] < self.ttl)
+
+        if not os.path.exists(SCHEMAS_BASE_PATH):
+            os.makedirs(SCHEMAS_BASE_PATH)
+        tmp_path = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.rename(tmp_path, self.path)
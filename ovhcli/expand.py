@@ -0,0 +1,115 @@
+# -*- encoding: utf-8 -*-
+'''
+Parallel expansion of ID listings into full objects
+'''
+
+from threading import Thread
+from Queue import Queue, Empty
+
+from ovhcli.utils import quote_chunk
+
+CONCURRENT = 20
+
+def doWork(client, urls, data, errors):
+    while True:
+        try:
+            elem, url = urls.get_nowait()
+        except Empty:
+            return
+        try:
+            data.append((elem, client.get(url)))
+        except Exception as e:
+            errors.append((elem, e))
+        urls.task_done()
+
+def batch_get(client, urls, errors=None):
+    '''
+    Get all urls in queue using client
+
+    :param list errors: when set, ``(id, error)`` of failed GETs are appended
+                        to it instead of raised
+    :raise: the first error of the underlying GETs, once all are done
+    '''
+    result = []
+    failures = []
+
+    # Create thread pool
+    threads = []
+    for i in xrange(min(urls.qsize(), CONCURRENT)):
+        t = Thread(target=doWork, args=(client, urls, result, failures))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    # Wait for all threads to be done
+    for t in threads:
+        t.join()
+
+    if errors is not None:
+        errors.extend(failures)
+    elif failures:
+        raise failures[0][1]
+
+    # All done
+    return result
+
+def expand_listing(client, method, ids, errors=None):
+    '''
+    Get all objects of an ID listing
+
+    :param list errors: see ``batch_get``
+    :return: list of ``(id, object)``, in no particular order
+    :raise: the first error of the underlying GETs
+    '''
+    urls = Queue()
+    for elem in ids:
+        urls.put((elem, method+'/'+quote_chunk(elem)));
+    return batch_get(client, urls, errors)
+
+def iter_expand_listing(client, method, ids):
+    '''
+    Get all objects of an ID listing and yield them as soon as they arrive.
+    Workers block when ``CONCURRENT`` objects are waiting to be consumed, so
+    memory does not grow with the listing size.
+
+    :return: generator of ``(id, object)``, in no particular order
+    :raise: the first error of the underlying GETs
+    '''
+    urls = Queue()
+    for elem in ids:
+        urls.put((elem, method+'/'+quote_chunk(elem)))
+    results = Queue(CONCURRENT)
+
+    def work():
+        while True:
+            try:
+                elem, url = urls.get_nowait()
+            except Empty:
+                results.put(None)
+                return
+            try:
+                results.put((elem, client.get(url), None))
+            except Exception as e:
+                results.put((elem, None, e))
+
+    workers = min(urls.qsize(), CONCURRENT)
+    for i in xrange(workers):
+        t = Thread(target=work)
+        t.daemon = True
+        t.start()
+
+    while workers:
+        result = results.get()
+        if result is None:
+            workers -= 1
+            continue
+
+        elem, data, error = result
+        if error is not None:
+            raise error
+        yield elem, data
+
+def is_id_listing(verb, data):
+    return verb == 'GET'\
+       and isinstance(data, list)\
+       and data and isinstance(data[0], (int, long, str, unicode))
@@ -0,0 +1,122 @@
+# -*- encoding: utf-8 -*-
+'''
+Streaming tabular export, shared by the 'csv' and 'tsv' formaters.
+
+Rows are written as soon as objects are fetched. Columns are fixed from the
+first ``SAMPLE_SIZE`` objects. Keys first seen after that go to a trailing
+'_other' column, as json, so that memory does not grow with the export size
+and all rows share the same header.
+'''
+
+import csv
+import json
+
+from ovhcli.utils import pretty_print_value_dict, pretty_print_value_scalar
+from ovhcli.expand import iter_expand_listing, is_id_listing
+
+SAMPLE_SIZE = 100
+
+TAG_COLUMN = '_endpoint'
+ID_COLUMN = '_id'
+OVERFLOW_COLUMN = '_other'
+
+def flatten_value(data):
+    '''
+    Render ``data`` as a single cell. Values with a unit and prices are
+    rendered like in the terminal, other nested values as json.
+    '''
+    if data is None:
+        return u''
+    if isinstance(data, dict):
+        if sorted(data.keys()) in ([u'unit', u'value'], [u'currencyCode', u'text', u'value']):
+            return pretty_print_value_dict(data)
+        return json.dumps(data, sort_keys=True)
+    if isinstance(data, list):
+        if all(not isinstance(value, (dict, list)) for value in data):
+            return u', '.join(pretty_print_value_scalar(value) for value in data)
+        return json.dumps(data, sort_keys=True)
+    return unicode(data)
+
+def encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+class TableWriter(object):
+    def __init__(self, output, delimiter, with_tags, with_ids):
+        self.writer = csv.writer(output, delimiter=delimiter, lineterminator='\n')
+        self.with_tags = with_tags
+        self.with_ids = with_ids
+        self.sample = [] #: rows waiting for the header, ``None`` once written
+        self.columns = None
+
+    def add(self, tag, item, line):
+        if self.sample is None:
+            self.write(tag, item, line)
+            return
+
+        self.sample.append((tag, item, line))
+        if len(self.sample) >= SAMPLE_SIZE:
+            self.flush()
+
+    def flush(self):
+        '''
+        Fix columns from the sample, write header and sampled rows.
+        '''
+        if not self.sample:
+            return
+
+        self.columns = []
+        for tag, item, line in self.sample:
+            self.columns += [key for key in line if key not in self.columns]
+
+        headers = [TAG_COLUMN] if self.with_tags else []
+        headers += [ID_COLUMN] if self.with_ids else []
+        self.writer.writerow([encode(name) for name in headers + self.columns + [OVERFLOW_COLUMN]])
+
+        sample, self.sample = self.sample, None
+        for row in sample:
+            self.write(*row)
+
+    def write(self, tag, item, line):
+        row = [tag] if self.with_tags else []
+        row += [flatten_value(item)] if self.with_ids else []
+        row += [flatten_value(line.get(key)) for key in self.columns]
+
+        overflow = dict((key, value) for key, value in line.iteritems() if key not in self.columns)
+        row.append(json.dumps(overflow, sort_keys=True) if overflow else u'')
+
+        self.writer.writerow([encode(value) for value in row])
+
+def iter_rows(client, verb, method, data):
+    '''
+    :return: generator of ``(id, object)``. ID listings are expanded on the
+             fly, ``id`` is ``None`` for other data. Scalars are wrapped in a
+             single 'value' field
+    '''
+    if is_id_listing(verb, data):
+        for item, line in iter_expand_listing(client, method, data):
+            yield item, line
+    elif isinstance(data, list):
+        for line in data:
+            yield None, line if isinstance(line, dict) else {'value': line}
+    elif isinstance(data, dict):
+        yield None, data
+    elif data is not None:
+        yield None, {'value': data}
+
+def export(output, delimiter, verb, method, results):
+    '''
+    Write ``results`` as a single table. Tags are written in a leading
+    column when there are more than one result.
+
+    :param results: list of ``(tag, client, data)``
+    '''
+    with_tags = len(results) > 1
+    with_ids = any(is_id_listing(verb, data) for tag, client, data in results)
+    table = TableWriter(output, delimiter, with_tags, with_ids)
+
+    for tag, client, data in results:
+        for item, line in iter_rows(client, verb, method, data):
+            table.add(tag, item, line)
+    table.flush()
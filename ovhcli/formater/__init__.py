@@ -3,9 +3,10 @@
 import pkgutil
 import imp
 
-# HACK: ensure yaml/json lib in cache is the global one:
+# HACK: ensure yaml/json/csv lib in cache is the global one:
 import yaml
 import json
+import csv
 
 formaters = dict([(name, importer) for importer, name, _ in pkgutil.iter_modules(['ovhcli/formater'])])
 
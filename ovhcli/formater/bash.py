@@ -13,11 +13,21 @@ def bash_pretty_print_value_scalar(data):
 
 def do_format(client, verb, method, arguments):
     data = getattr(client, verb.lower())(method, **arguments)
+    print_data(client, verb, method, data)
 
+def print_data(client, verb, method, data, prefix=PREFIX):
     if isinstance(data, list):
-    	print PREFIX+"LIST='"+' '.join(data)+"'"
+    	print prefix+"LIST='"+' '.join(data)+"'"
     elif isinstance(data, dict):
     	for key, value in data.iteritems():
-    		print PREFIX+camel_to_bash(key)+"="+bash_pretty_print_value_scalar(value)
+    		print prefix+camel_to_bash(key)+"="+bash_pretty_print_value_scalar(value)
     else:
-		print PREFIX+"VALUE="+bash_pretty_print_value_scalar(value)
+		print prefix+"VALUE="+bash_pretty_print_value_scalar(data)
+
+def print_tagged(verb, method, results):
+    '''
+    Variables of each endpoint / account are prefixed with its tag. For
+    instance, 'ovh-eu:acme' leads to 'OVH_OVH_EU_ACME_'.
+    '''
+    for tag, client, data in results:
+    	print_data(client, verb, method, data, PREFIX+re.sub('[^A-Za-z0-9]', '_', tag).upper()+'_')
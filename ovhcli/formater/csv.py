@@ -0,0 +1,15 @@
+# -*- encoding: utf-8 -*-
+
+import sys
+
+from ovhcli.export import export
+
+def do_format(client, verb, method, arguments):
+    data = getattr(client, verb.lower())(method, **arguments)
+    print_data(client, verb, method, data)
+
+def print_data(client, verb, method, data):
+    export(sys.stdout, ',', verb, method, [(None, client, data)])
+
+def print_tagged(verb, method, results):
+    export(sys.stdout, ',', verb, method, results)
@@ -4,7 +4,9 @@ import json
 
 def do_format(client, verb, method, arguments):
     data = getattr(client, verb.lower())(method, **arguments)
+    print_data(client, verb, method, data)
 
+def print_data(client, verb, method, data):
     print json.dumps(
         data,
         sort_keys=True,
@@ -12,3 +14,5 @@ def do_format(client, verb, method, arguments):
         separators=(',', ': ')
     )
 
+def print_tagged(verb, method, results):
+    print_data(None, verb, method, dict((tag, data) for tag, client, data in results))
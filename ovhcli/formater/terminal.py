@@ -1,79 +1,16 @@
 # -*- encoding: utf-8 -*-
 
-import urllib
 import datetime
 import tabulate
 import textwrap
 
-from threading import Thread
-from Queue import Queue
-
 from ovhcli.utils import grouped, camel_to_snake, camel_to_human
-from ovhcli.utils import pretty_print_value_scalar, pretty_print_key_scalar
-
-## parallel requests
-
-CONCURRENT = 20
-q = Queue()
-
-def doWork(client, urls, data):
-    while not urls.empty():
-        elem, url = urls.get()
-        data.append((elem, client.get(url)))
-        urls.task_done()
-
-def batch_get(client, urls):
-    '''
-    Get all urls in queue using client
-    '''
-    result = []
-
-    # Create thread pool
-    threads = []
-    for i in xrange(min(urls.qsize(), CONCURRENT)):
-        t = Thread(target=doWork, args=(client, urls, result))
-        t.daemon = True
-        t.start()
-        threads.append(t)
-
-    # Wait for all threads to be done
-    for t in threads:
-        t.join()
-
-    # All done
-    return result
+from ovhcli.utils import pretty_print_value_scalar, pretty_print_key_scalar, pretty_print_value
+from ovhcli.multi import fan_out
+from ovhcli.expand import expand_listing, is_id_listing
 
 ## utils
 
-def pretty_print_value_dict(data):
-    # values ?
-    if sorted(data.keys()) == [u'unit', u'value']:
-        return u"%s%s" % (pretty_print_value_scalar(data['value']), data['unit'])
-    # prices
-    if sorted(data.keys()) == [u'currencyCode', u'text', u'value']:
-        return pretty_print_value_scalar(data['text'])
-    # fallback
-    else:
-        return str(data)
-
-def pretty_print_value_list(data):
-    # values ?
-    if data:
-        return ', '.join([pretty_print_value_scalar(x) for x in data])
-    # fallback
-    else:
-        return '<empty list>'
-
-def pretty_print_value(data):
-    if isinstance(data, (int, long, float)):
-        return pretty_print_value_scalar(data)
-    elif isinstance(data, dict):
-        return pretty_print_value_dict(data)
-    elif isinstance(data, list):
-        return pretty_print_value_list(data)
-    else:
-        return unicode(data)
-
 def pretty_print_table(data, max_col_width=50, headers=None):
     # redy to print lines
     table = []
@@ -101,23 +38,15 @@ def pretty_print_table(data, max_col_width=50, headers=None):
 
 def do_format(client, verb, method, arguments):
     data = getattr(client, verb.lower())(method, **arguments)
+    print_data(client, verb, method, data)
 
+def print_data(client, verb, method, data):
     # looks a *lot* like a listing: get all elements
-    if verb == 'GET'\
-       and isinstance(data, list)\
-       and data and isinstance(data[0], (int, long, str, unicode)):
-
-        # Early exit if the list of IDs is empty
-        if not data:
-            return
-
+    if is_id_listing(verb, data):
         table = []
-        urls = Queue()
-        for elem in data:
-            urls.put((elem, method+'/'+urllib.quote_plus(str(elem))));
 
         # Get the data
-        lines = batch_get(client, urls)
+        lines = expand_listing(client, method, data)
 
         # If the id is repeated on the data, skip the field
         item = str(lines[0][0])
@@ -213,3 +142,51 @@ def do_format(client, verb, method, arguments):
       # Should no be here...
       print data
 
+def print_tagged(verb, method, results):
+    '''
+    Merge results from multiple endpoints / accounts. Objects are printed in a
+    single table with a leading 'Endpoint' column. Columns are the union of all
+    object keys. Other values are printed one per line, prefixed with the tag.
+
+    :param results: list of ``(tag, client, data)``
+    '''
+    # expand all listings concurrently
+    def expand(client, data):
+        if is_id_listing(verb, data):
+            return sorted(expand_listing(client, method, data))
+        elif isinstance(data, dict) and data:
+            return [(None, data)]
+        elif isinstance(data, list) and data and isinstance(data[0], dict):
+            return [(None, line) for line in data]
+        return data
+
+    rows = []
+    expanded = fan_out([(tag, lambda client=client, data=data: expand(client, data))
+                        for tag, client, data in results])
+    for tag, data, error in expanded:
+        if error is not None:
+            print '%s: %s' % (tag, error)
+        elif isinstance(data, list) and data and isinstance(data[0], tuple):
+            rows += [(tag, item, line) for item, line in data]
+        elif isinstance(data, list):
+            for value in data:
+                print '%s: %s' % (tag, pretty_print_value_scalar(value))
+        elif data is None:
+            print '%s: Success' % tag
+        else:
+            print '%s: %s' % (tag, pretty_print_value(data))
+
+    if not rows:
+        return
+
+    keys = []
+    for tag, item, line in rows:
+        keys += [key for key in line if key not in keys]
+    with_ids = any(item is not None for tag, item, line in rows)
+
+    table = []
+    for tag, item, line in rows:
+        table.append([tag] + ([item] if with_ids else []) + [line.get(key, '') for key in keys])
+
+    headers = ['Endpoint'] + (['ID'] if with_ids else []) + [camel_to_human(str(title)) for title in keys]
+    print pretty_print_table(table, headers=headers, max_col_width=50)
@@ -6,4 +6,10 @@ import pyaml
 
 def do_format(client, verb, method, arguments):
     data = getattr(client, verb.lower())(method, **arguments)
+    print_data(client, verb, method, data)
+
+def print_data(client, verb, method, data):
     print pyaml.dump(data)
+
+def print_tagged(verb, method, results):
+    print_data(None, verb, method, dict((tag, data) for tag, client, data in results))
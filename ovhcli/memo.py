@@ -0,0 +1,108 @@
+# -*- encoding: utf-8 -*-
+'''
+Per-process GET memoization.
+
+Identical GETs are sent once per process: concurrent requests wait for the
+first one to complete (single flight) and later ones are answered from a
+bounded LRU. Any mutation drops memoized results of overlapping paths, for
+instance, a POST on '/domain/zone/example.com/record' drops
+'/domain/zone/example.com' and '/domain/zone/example.com/record/42'.
+
+Memoized results are shared, callers must not modify them.
+'''
+
+from threading import Lock, Event
+from collections import OrderedDict
+
+DEFAULT_SIZE = 1024
+
+def paths_overlap(path, other):
+    '''
+    :return: ``True`` when one path is the other or one of its parents. Query
+             strings are ignored.
+    '''
+    path = path.split('?', 1)[0].rstrip('/')+'/'
+    other = other.split('?', 1)[0].rstrip('/')+'/'
+    return path.startswith(other) or other.startswith(path)
+
+class Flight(object):
+    '''
+    A GET in progress, other callers wait for its outcome.
+    '''
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+        self.stale = False
+
+class GetMemo(object):
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.lock = Lock()
+        self.cache = OrderedDict() #: path: result, least recently used first
+        self.flights = {} #: path: flight
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def get(self, path, fetch):
+        '''
+        :param fetch: callable doing the actual GET on ``path``
+        :return: memoized or fetched result
+        '''
+        with self.lock:
+            if path in self.cache:
+                self.hits += 1
+                result = self.cache.pop(path)
+                self.cache[path] = result
+                return result
+
+            flight = self.flights.get(path)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self.flights[path] = Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fetch()
+        except Exception as e:
+            flight.error = e
+            raise
+        else:
+            with self.lock:
+                if not flight.stale:
+                    self.cache[path] = flight.result
+                    while len(self.cache) > self.size:
+                        self.cache.popitem(last=False)
+        finally:
+            with self.lock:
+                del self.flights[path]
+            flight.done.set()
+
+        return flight.result
+
+    def invalidate(self, path):
+        '''
+        Drop results of all paths overlapping ``path``. GETs in progress on
+        these paths are not memoized.
+        '''
+        with self.lock:
+            for cached in [cached for cached in self.cache if paths_overlap(cached, path)]:
+                del self.cache[cached]
+                self.invalidated += 1
+            for flying, flight in self.flights.iteritems():
+                if paths_overlap(flying, path):
+                    flight.stale = True
+
+    def get_stats(self):
+        return 'GET memo: %d sent, %d memoized, %d coalesced, %d invalidated' % (
+            self.misses, self.hits, self.coalesced, self.invalidated)
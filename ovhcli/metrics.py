@@ -0,0 +1,185 @@
+# -*- encoding: utf-8 -*-
+'''
+API usage metrics, keyed by route template.
+
+Each request sent to the API is counted by endpoint, HTTP verb, route template
+(for instance '/dedicated/server/{serviceName}/task') and status code, along
+with its latency and size. Metrics are flushed on exit:
+  - to a Prometheus textfile when the file name ends with '.prom'. Counters
+    are cumulative across runs, thanks to a '.state' file next to it
+  - as json lines otherwise, one line per route and run
+'''
+
+import os
+import json
+import time
+import fcntl
+
+from bisect import bisect_left
+from threading import Lock
+
+from ovhcli.routes import match_route
+
+#: latency histogram buckets upper bounds, in seconds
+BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+UNKNOWN_ROUTE = 'unknown'
+
+def group_routes(index):
+    '''
+    Group route ``index`` templates by chunk count and first chunk, so that
+    only a few templates are tried for each path.
+
+    :return: dict of ``(chunk count, first chunk): {template: verbs}``
+    '''
+    groups = {}
+    for template, verbs in index.iteritems():
+        chunks = template.strip('/').split('/')
+        groups.setdefault((len(chunks), chunks[0]), {})[template] = verbs
+    return groups
+
+def new_stats():
+    return {
+        'codes': {},
+        'buckets': [0]*(len(BUCKETS)+1),
+        'duration': 0.0,
+        'sent': 0,
+        'received': 0,
+    }
+
+def merge_stats(stats, other):
+    for code, count in other['codes'].iteritems():
+        stats['codes'][code] = stats['codes'].get(code, 0) + count
+    stats['buckets'] = [a+b for a, b in zip(stats['buckets'], other['buckets'])]
+    for name in ['duration', 'sent', 'received']:
+        stats[name] += other[name]
+
+class Metrics(object):
+    def __init__(self, get_route_index):
+        '''
+        :param get_route_index: callable returning the route index of an
+                                endpoint, see ``ovhcli.routes``
+        '''
+        self.get_route_index = get_route_index
+        self.lock = Lock()
+        self.routes = {} #: endpoint: grouped route index
+        self.series = {} #: (endpoint, verb, route): stats
+
+    def get_route(self, endpoint, path):
+        if endpoint not in self.routes:
+            self.routes[endpoint] = group_routes(self.get_route_index(endpoint) or {})
+
+        chunks = path.split('?', 1)[0].strip('/').split('/')
+        group = self.routes[endpoint].get((len(chunks), chunks[0]), {})
+        return match_route(group, path) or UNKNOWN_ROUTE
+
+    def record(self, endpoint, verb, path, duration, status, sent, received):
+        '''
+        Record a request. ``status`` is ``None`` when no response was received.
+        '''
+        with self.lock:
+            key = (endpoint, verb, self.get_route(endpoint, path))
+            stats = self.series.get(key)
+            if stats is None:
+                stats = self.series[key] = new_stats()
+
+            code = str(status) if status is not None else 'error'
+            stats['codes'][code] = stats['codes'].get(code, 0) + 1
+            stats['buckets'][bisect_left(BUCKETS, duration)] += 1
+            stats['duration'] += duration
+            stats['sent'] += sent
+            stats['received'] += received
+
+    ## output
+
+    def flush(self, path):
+        if not self.series:
+            return
+        if path.endswith('.prom'):
+            self.flush_prometheus(path)
+        else:
+            self.flush_json_lines(path)
+
+    def flush_json_lines(self, path):
+        now = time.time()
+        with open(path, 'a') as f:
+            for (endpoint, verb, route), stats in sorted(self.series.iteritems()):
+                f.write(json.dumps({
+                    'time': now,
+                    'endpoint': endpoint,
+                    'method': verb,
+                    'route': route,
+                    'codes': stats['codes'],
+                    'count': sum(stats['buckets']),
+                    'duration': stats['duration'],
+                    'buckets': dict(zip([str(bound) for bound in BUCKETS]+['+Inf'], stats['buckets'])),
+                    'sent': stats['sent'],
+                    'received': stats['received'],
+                }, sort_keys=True)+'\n')
+
+    def flush_prometheus(self, path):
+        '''
+        Merge this run into cumulative state and rewrite the textfile. The
+        state file is locked, so that concurrent runs do not lose counts.
+        '''
+        with open(path+'.state', 'a+') as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            state_file.seek(0)
+            try:
+                state = dict((tuple(json.loads(key)), stats)
+                             for key, stats in json.loads(state_file.read()).iteritems())
+            except ValueError:
+                state = {}
+
+            for key, stats in self.series.iteritems():
+                if key in state:
+                    merge_stats(state[key], stats)
+                else:
+                    state[key] = stats
+
+            tmp_path = '%s.%d.tmp' % (path, os.getpid())
+            with open(tmp_path, 'w') as f:
+                f.write(render_prometheus(state))
+            os.rename(tmp_path, path)
+
+            state_file.seek(0)
+            state_file.truncate()
+            state_file.write(json.dumps(dict((json.dumps(key), stats) for key, stats in state.iteritems())))
+
+def format_labels(**labels):
+    return ','.join('%s="%s"' % (name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for name, value in sorted(labels.iteritems()))
+
+def render_prometheus(state):
+    lines = [
+        '# HELP ovh_cli_requests_total API requests, by route template and status code.',
+        '# TYPE ovh_cli_requests_total counter',
+    ]
+    for (endpoint, verb, route), stats in sorted(state.iteritems()):
+        for code, count in sorted(stats['codes'].iteritems()):
+            lines.append('ovh_cli_requests_total{%s} %d' % (
+                format_labels(endpoint=endpoint, method=verb, route=route, code=code), count))
+
+    lines += [
+        '# HELP ovh_cli_request_duration_seconds API request latency, by route template.',
+        '# TYPE ovh_cli_request_duration_seconds histogram',
+    ]
+    for (endpoint, verb, route), stats in sorted(state.iteritems()):
+        labels = format_labels(endpoint=endpoint, method=verb, route=route)
+        total = 0
+        for bound, count in zip([str(bound) for bound in BUCKETS]+['+Inf'], stats['buckets']):
+            total += count
+            lines.append('ovh_cli_request_duration_seconds_bucket{%s,le="%s"} %d' % (labels, bound, total))
+        lines.append('ovh_cli_request_duration_seconds_sum{%s} %f' % (labels, stats['duration']))
+        lines.append('ovh_cli_request_duration_seconds_count{%s} %d' % (labels, total))
+
+    for name, field, description in [('ovh_cli_request_bytes_total', 'sent', 'Request body bytes sent'),
+                                     ('ovh_cli_response_bytes_total', 'received', 'Response body bytes received')]:
+        lines += [
+            '# HELP %s %s, by route template.' % (name, description),
+            '# TYPE %s counter' % name,
+        ]
+        for (endpoint, verb, route), stats in sorted(state.iteritems()):
+            lines.append('%s{%s} %d' % (name, format_labels(endpoint=endpoint, method=verb, route=route), stats[field]))
+
+    return '\n'.join(lines)+'\n'
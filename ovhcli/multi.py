@@ -0,0 +1,89 @@
+# -*- encoding: utf-8 -*-
+'''
+Run the same command against multiple endpoints and/or credential profiles.
+
+A target is written ``endpoint[:profile]``. ``profile`` is a section of
+``ovh.conf`` holding ``application_key``, ``application_secret`` and
+``consumer_key``. When omitted, default credentials of ``endpoint`` are used.
+'''
+
+from threading import Thread
+
+from ovh.client import ENDPOINTS
+from ovh.config import config
+from ConfigParser import NoSectionError, NoOptionError
+
+class TargetException(Exception): pass
+
+def parse_targets(spec):
+    '''
+    Parse a comma separated list of targets.
+
+    :return: list of ``(tag, endpoint, profile)``
+    :raise TargetException: on unknown endpoint or profile
+    '''
+    targets = []
+    for tag in spec.split(','):
+        tag = tag.strip()
+        if not tag:
+            continue
+
+        if ':' in tag:
+            endpoint, profile = tag.split(':', 1)
+        else:
+            endpoint, profile = tag, None
+
+        if endpoint not in ENDPOINTS:
+            raise TargetException('Unknown endpoint %s in target %s' % (endpoint, tag))
+        if profile is not None and not config.config.has_section(profile):
+            raise TargetException('Unknown profile %s in target %s' % (profile, tag))
+
+        targets.append((tag, endpoint, profile))
+
+    if not targets:
+        raise TargetException('No target in %s' % spec)
+
+    return targets
+
+def get_profile_credentials(profile):
+    '''
+    Load credentials from ``profile`` section. Unlike regular configuration,
+    environment is *not* looked up as it would override all profiles.
+
+    :return: dict of client keyword arguments
+    '''
+    credentials = {}
+    for name in ['application_key', 'application_secret', 'consumer_key']:
+        try:
+            credentials[name] = config.config.get(profile, name)
+        except (NoSectionError, NoOptionError):
+            raise TargetException('Missing %s in profile %s' % (name, profile))
+    return credentials
+
+def fan_out(jobs):
+    '''
+    Run each job in its own thread.
+
+    :param jobs: list of ``(tag, callable)``
+    :return: list of ``(tag, result, error)``, in ``jobs`` order. ``error`` is
+             the raised exception or ``None``
+    '''
+    results = [None]*len(jobs)
+
+    def run(i, tag, job):
+        try:
+            results[i] = (tag, job(), None)
+        except Exception as e:
+            results[i] = (tag, None, e)
+
+    threads = []
+    for i, (tag, job) in enumerate(jobs):
+        t = Thread(target=run, args=(i, tag, job))
+        t.daemon = True
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+
+    return results
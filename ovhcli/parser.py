@@ -4,10 +4,10 @@ Argument parser, supports 'url-like' positional argument sequence
 '''
 
 import json
-import urllib
+import hashlib
 import argparse
 
-from ovhcli.utils import camel_to_snake
+from ovhcli.utils import camel_to_snake, quote_chunk
 
 ACTION_ALIASES = {
     'get': 'GET',
@@ -32,6 +32,13 @@ ACTION_ALIASES = {
     'do_delete': 'DELETE',
 }
 
+#: global model index, shared across all resource schemas. Models are
+#: referenced by type name
+MODELS = {}
+
+#: interned strings table. Unlike ``intern``, accepts unicode strings
+_INTERNED = {}
+
 class ArgParserException(Exception): pass
 class ArgParserTypeConflict(ArgParserException): pass
 class ArgParserUnknownRoute(ArgParserException): pass
@@ -42,17 +49,164 @@ def parse_bool(data):
         return False
     return True
 
+#: argument type names, as stored in compiled argument specs
+ARGUMENT_TYPES = {
+    'str': str,
+    'long': long,
+    'int': int,
+    'float': float,
+    'bool': parse_bool,
+    'json': json.loads,
+}
+
 def schema_datatype_to_type(datatype):
-    if datatype == 'string': return str
-    if datatype == 'text':   return str
-    if datatype == 'long':   return long
-    if datatype == 'int':    return int
-    if datatype == 'float':  return float
-    if datatype == 'double': return float
-    if datatype == 'boolean': return parse_bool
-    if datatype in ['ip', 'ipBlock']: return str
+    '''
+    :return: argument type name in ``ARGUMENT_TYPES`` or ``None`` if
+             ``datatype`` is not a scalar type
+    '''
+    if datatype == 'string': return 'str'
+    if datatype == 'text':   return 'str'
+    if datatype == 'long':   return 'long'
+    if datatype == 'int':    return 'int'
+    if datatype == 'float':  return 'float'
+    if datatype == 'double': return 'float'
+    if datatype == 'boolean': return 'bool'
+    if datatype in ['ip', 'ipBlock']: return 'str'
     return None
 
+def intern_str(value):
+    '''
+    Intern ``value`` if this is a string, so that identical names and type
+    names share the same object in memory.
+    '''
+    if isinstance(value, basestring):
+        return _INTERNED.setdefault(value, value)
+    return value
+
+def compact_model(model):
+    '''
+    Keep only model fields needed to build action parameters.
+    '''
+    compact = {}
+    if 'enum' in model:
+        compact['enum'] = [intern_str(value) for value in model['enum']]
+        compact['enumType'] = intern_str(model.get('enumType', 'string'))
+    if 'properties' in model:
+        compact['properties'] = dict((intern_str(name), {
+            'type': intern_str(prop.get('type')),
+            'readOnly': prop.get('readOnly', 1),
+            'canBeNull': prop.get('canBeNull', 0),
+            'description': intern_str(prop.get('description', '')),
+        }) for name, prop in model['properties'].iteritems())
+    return compact
+
+def register_models(models):
+    '''
+    Register ``models`` from a resource schema in the global model table.
+    '''
+    for name, model in models.iteritems():
+        MODELS[intern_str(name)] = compact_model(model)
+
+def strip_array(typename):
+    if typename and typename.endswith('[]'):
+        return typename[:-2]
+    return typename
+
+def get_resource_hash(schema):
+    '''
+    Hash resource ``schema`` content together with the models its actions
+    depend on, so that a change in a model declared by another resource is
+    detected too. Models must be registered first.
+    '''
+    types = set()
+    for api in schema['apis']:
+        for operation in api['operations']:
+            for param in operation['parameters'] or []:
+                typename = strip_array(param.get('dataType'))
+                types.add(typename)
+                for prop in MODELS.get(typename, {}).get('properties', {}).itervalues():
+                    types.add(strip_array(prop['type']))
+
+    models = dict((name, MODELS[name]) for name in types if name in MODELS)
+    return hashlib.sha1(json.dumps([schema['apis'], models])).hexdigest()
+
+def compile_argument(action, name, type, required, description):
+    '''
+    Resolve a single swagger parameter against the global model table.
+
+    :return: argument spec ``(name, type_name, is_array, required, choices, help)``
+    '''
+    choices = None
+    description = description or ''
+    description = description.replace('%', '%%') # Encode description to fix some help printing
+
+    # Decode datatype
+    is_array = type.endswith('[]')
+    if is_array:
+        type = type[:-2]
+        description = '(list) '+description
+    datatype = schema_datatype_to_type(type)
+
+    # Decode complex data types
+    if datatype is None:
+        if type in MODELS:
+            model = MODELS[type]
+            if 'enum' in model:
+                datatype = schema_datatype_to_type(model['enumType']) or 'str'
+                choices = tuple(model['enum'])
+            elif 'properties' in model:
+                datatype = 'json'
+            else:
+                datatype = 'str'
+        else:
+            datatype = 'str'
+
+    # Never require a '--' (not part of the path) parameter on PUT
+    if action == "PUT":
+        required = False
+
+    return (intern_str(name), datatype, is_array, bool(required), choices, intern_str(description))
+
+def compile_action_arguments(action, parameters):
+    '''
+    Resolve swagger ``parameters`` of ``action`` into argument specs. Path
+    parameters are part of the route and skipped. For PUT, the edited object
+    is expanded into its writable fields.
+
+    :return: tuple of argument specs, see ``compile_argument``
+    '''
+    arguments = []
+
+    for param in parameters or []:
+        if param.get('paramType') == 'path':
+            continue
+
+        # For PUT case, we need to add individual fields of the object to edit
+        typename = param.get('dataType')
+        if action == "PUT" and typename in MODELS and 'properties' in MODELS[typename]:
+            model = MODELS[typename]
+            for name, prop in model['properties'].iteritems():
+                if prop.get('readOnly', 1) != 0:
+                    continue
+
+                arguments.append(compile_argument(
+                    action,
+                    name,
+                    prop['type'],
+                    not bool(prop.get('canBeNull', 0)),
+                    prop.get('description', ''),
+                ))
+        else:
+            arguments.append(compile_argument(
+                action,
+                param.get('name'),
+                typename,
+                bool(param.get('required', 0)),
+                param.get('description', ''),
+            ))
+
+    return tuple(arguments)
+
 class ArgParser(object):
     '''
     Recursively parse arbitrary url-like argument list. Internaly, maintains an
@@ -76,22 +230,27 @@ class ArgParser(object):
 
     For example, 'me bill random_id' will be parsed to
     '/me/bill/random_id'
+
+    Nodes are slotted and do not hold their schema. Action arguments are
+    resolved against the global ``MODELS`` table when the tree is built and
+    stored as compact argument specs.
     '''
-    def __init__(self, name=None, path=None, help="", schema=None):
+    __slots__ = ('name', 'path', 'help', '_actions', '_routes')
+
+    def __init__(self, name=None, path=None, help=""):
         '''
         :param str name: argument name as expected on the command line
                          if ``None``, consider this chunk as an argument
         :param str path: original path chunk name in the URL or variable name
         :param str help: help string for this level
         '''
-        self.name = name
-        self.path = path
+        self.name = intern_str(name)
+        self.path = intern_str(path)
         self.help = ""
-        self.schema = schema or {'models': {}}
         self._actions = {} #: action_name: action_parser
         self._routes = {} #: route.name: route
 
-    def ensure_parser(self, chunk, path=None, help="", schema=None):
+    def ensure_parser(self, chunk, path=None, help=""):
         '''
         if ``chunk`` starts with '{' set ``name`` and ``path`` to None.
         Otherwise, set name to snake-case path.
@@ -117,10 +276,64 @@ class ArgParser(object):
             return self._routes[name]
 
         # register
-        self._routes[name] = ArgParser(name, path, help, schema)
+        self._routes[name] = ArgParser(name, path, help)
         return self._routes[name]
 
-    def ensure_path_parser(self, path, help="", schema=None):
+    def add_parser(self, parser):
+        '''
+        Register an already built sub parser, replacing any parser with the
+        same name.
+        '''
+        self._routes[parser.name] = parser
+
+    def to_data(self):
+        '''
+        :return: this parser and its sub parsers as plain json serializable
+                 data, see ``from_data``. Argument specs are shared by many
+                 actions, they are stored once and referenced by index.
+        '''
+        specs = {}
+        tree = self._to_data(specs)
+        return [sorted(specs, key=specs.get), tree]
+
+    def _to_data(self, specs):
+        actions = dict((verb, [[specs.setdefault(spec, len(specs)) for spec in action['arguments']],
+                               action['help']])
+                       for verb, action in self._actions.iteritems())
+        return [self.name, self.path, self.help, actions,
+                [route._to_data(specs) for route in self._routes.itervalues()]]
+
+    @classmethod
+    def from_data(cls, data):
+        '''
+        Rebuild a parser tree from ``to_data`` output.
+
+        :raise ValueError: if ``data`` is malformed
+        '''
+        try:
+            specs, tree = data
+            specs = [(intern_str(name), intern_str(datatype), is_array, required,
+                      tuple(choices) if choices is not None else None, intern_str(description))
+                     for name, datatype, is_array, required, choices, description in specs]
+            return cls._from_data(tree, specs)
+        except (TypeError, ValueError, KeyError, IndexError, AttributeError):
+            raise ValueError('Malformed parser data')
+
+    @classmethod
+    def _from_data(cls, data, specs):
+        name, path, help, actions, routes = data
+        parser = cls(name, path)
+        parser.help = help
+        for verb, (arguments, action_help) in actions.iteritems():
+            parser._actions[intern_str(verb)] = {
+                'arguments': tuple([specs[index] for index in arguments]),
+                'help': action_help,
+            }
+        for route in routes:
+            parser.add_parser(cls._from_data(route, specs))
+        return parser
+
+    def ensure_path_parser(self, path, help=""):
         '''
         Utility function. Ensures that ``path`` will be matchable by this
         parser. If applicablen create intermediate parsers.
@@ -142,8 +355,8 @@ class ArgParser(object):
         else:
             chunk, path = path, ''
 
-        parser = self.ensure_parser(chunk, schema=schema)
-        return parser.ensure_path_parser(path, help, schema)
+        parser = self.ensure_parser(chunk)
+        return parser.ensure_path_parser(path, help)
 
     def register_http_verb(self, verb, parameters, help):
         '''
@@ -155,6 +368,8 @@ class ArgParser(object):
         PUT    --> update
         DELETE --> delete
 
+        All models referenced by ``parameters`` must be registered first.
+
         :param str help: help message for this action
         '''
         verb = verb.upper()
@@ -164,7 +379,7 @@ class ArgParser(object):
             raise ArgParserTypeConflict('Duplicated actions %s' % name)
 
         self._actions[verb] = {
-            'parameters': parameters,
+            'arguments': compile_action_arguments(verb, parameters),
             'help': help,
         }
 
@@ -205,7 +420,7 @@ class ArgParser(object):
             if None in self._routes:
                 # TODO: encode argument
                 parser = self._routes[None]
-                base_url += '/'+urllib.quote_plus(chunk)
+                base_url += '/'+quote_chunk(chunk)
                 return parser.parse(base_url, args)
 
             # Ooops
@@ -233,84 +448,103 @@ class ArgParser(object):
             # ambiguous
             raise ArgParserUnknownRoute('No default actions is available for %s. Please pick one manually' % base_url)
 
-    def _register_parser_command(self, parser, action, name, type, required, description):
-        choices = None
-        description = description or ''
-        description = description.replace('%', '%%') # Encode description to fix some help printing
-
-        # Decode datatype
-        is_array = type.endswith('[]')
-        if is_array:
-            type = type[:-2]
-            description = '(list) '+description
-        datatype = schema_datatype_to_type(type)
-
-        # Decode complex data types
-        if datatype is None:
-            if type in self.schema['models']:
-                model = self.schema['models'][type]
-                if 'enum' in model:
-                    datatype = schema_datatype_to_type(model['enumType'])
-                    choices = model['enum']
-                elif 'properties' in model:
-                    datatype = json.loads
-                else:
-                    datatype = str
-            else:
-                datatype = str
-
-        # Never require a '--' (not part of the path) parameter on PUT
-        if action == "PUT":
-            required = False
-
-        # Register command
-        parser.add_argument(
-                '--'+name,
-                type=datatype,
-                action='append' if is_array else 'store',
-                required=required,
-                help=description,
-                default=argparse.SUPPRESS,
-                choices=choices,
-        )
-
     def parse_action_params(self, action, args, base_url):
         '''
         parse remaining positional arguments
         '''
         parser = argparse.ArgumentParser(action+' '+base_url)
 
-        for param in self._actions[action]['parameters'] or []:
-            if param['paramType'] == 'path':
+        for name, datatype, is_array, required, choices, description in self._actions[action]['arguments']:
+            parser.add_argument(
+                    '--'+name,
+                    type=ARGUMENT_TYPES[datatype],
+                    action='append' if is_array else 'store',
+                    required=required,
+                    help=description,
+                    default=argparse.SUPPRESS,
+                    choices=choices,
+            )
+
+        return parser.parse_args(args)
+
+    def complete(self, base_url, args, get_values):
+        '''
+        Suggest values for the last word of ``args``, the previous ones being
+        parsed like in ``parse``.
+
+        :param get_values: callable returning valid argument values for a
+                           listing path, for instance IDs of '/dedicated/server'
+        :return: list of candidates
+        '''
+        word = args[-1]
+
+        # walk the tree
+        if len(args) > 1 and not args[0].startswith('-'):
+            chunk = args[0]
+            if chunk in self._routes:
+                parser = self._routes[chunk]
+                return parser.complete(base_url+'/'+parser.path, args[1:], get_values)
+            if chunk in ACTION_ALIASES and ACTION_ALIASES[chunk] in self._actions:
+                return self.complete_action_params(ACTION_ALIASES[chunk], args[1:])
+            if None in self._routes:
+                return self._routes[None].complete(base_url+'/'+quote_chunk(chunk), args[1:], get_values)
+            return []
+
+        # named arguments of the default action
+        if args[0].startswith('-'):
+            if len(self._actions) == 1:
+                return self.complete_action_params(self._actions.keys()[0], args)
+            if 'GET' in self._actions:
+                return self.complete_action_params('GET', args)
+            return []
+
+        # sub paths, actions and argument values
+        candidates = [name for name in self._routes if name is not None]
+        candidates += [self.get_action_title(verb) for verb in self._actions]
+        if None in self._routes and 'GET' in self._actions:
+            candidates += [unicode(value) for value in get_values(base_url)]
+        return sorted(candidate for candidate in candidates if candidate.startswith(word))
+
+    def complete_action_params(self, action, args):
+        '''
+        Suggest argument names of ``action`` or, after an enum argument name,
+        its valid values.
+        '''
+        word = args[-1]
+        previous = args[-2] if len(args) > 1 else None
+        arguments = self._actions[action]['arguments']
+
+        for name, datatype, is_array, required, choices, description in arguments:
+            if previous != '--'+name:
                 continue
+            if choices:
+                return sorted(unicode(choice) for choice in choices if unicode(choice).startswith(word))
+            if datatype == 'bool':
+                return [value for value in ['false', 'true'] if value.startswith(word)]
+            return []
 
-            # For PUT case, we need to add individual fields of the object to edit
-            typename = param.get('dataType')
-            if action == "PUT" and typename in self.schema['models']:
-                model = self.schema['models'][typename]
-                for name, prop in model['properties'].iteritems():
-                    if prop.get('readOnly', 1) != 0:
-                        continue
-
-                    self._register_parser_command(
-                        parser,
-                        action,
-                        name,
-                        prop['type'],
-                        not bool(prop.get('canBeNull', 0)),
-                        prop.get('description', ''),
-                    )
-            else:
-                self._register_parser_command(
-                    parser,
-                    action,
-                    param.get('name'),
-                    typename,
-                    bool(param.get('required', 0)),
-                    param.get('description', ''),
-                )
+        return sorted('--'+argument[0] for argument in arguments if ('--'+argument[0]).startswith(word))
 
-        return parser.parse_args(args)
+    def iter_actions(self, prefix=''):
+        '''
+        :return: generator of ``(verb, route template, action)`` for this
+                 parser and all its sub parsers
+        '''
+        if self.path is not None:
+            prefix += '/'+self.path
+        for verb, action in self._actions.iteritems():
+            yield verb, prefix, action
+        for route in self._routes.itervalues():
+            for item in route.iter_actions(prefix):
+                yield item
+
+    def get_action_title(self, verb):
+        if verb == 'GET':
+            if None in self._routes: return 'list'
+            else: return 'show'
+        elif verb == 'POST': return 'create'
+        elif verb == 'PUT': return 'update'
+        else: return verb.lower()
 
     def get_help_message(self):
         msg = ''
@@ -337,12 +571,7 @@ class ArgParser(object):
             action_helps = ["Actions:"]
             for name, action in self._actions.iteritems():
                 # title
-                if name == 'GET':
-                    if None in self._routes: action_title='list'
-                    else: action_title='show'
-                elif name == 'POST': action_title='create'
-                elif name == 'PUT': action_title='update'
-                else: action_title=name.lower()
+                action_title = self.get_action_title(name)
 
                 # do we have an help message ?
                 if action['help']:
@@ -373,3 +602,23 @@ class ArgParser(object):
             msg += '\n'.join(routes_help)+'\n\n'
 
         return msg
+
+def diff_parsers(old, new):
+    '''
+    Compare the compiled actions of two parsers, either may be ``None``.
+    Unlike route indexes, changes in models, enums and help are detected.
+
+    :return: list of ``(change, verb, template)``, see ``diff_route_index``
+    '''
+    old_actions = dict(((verb, template), action) for verb, template, action in old.iter_actions()) if old else {}
+    new_actions = dict(((verb, template), action) for verb, template, action in new.iter_actions()) if new else {}
+
+    changes = []
+    for verb, template in set(old_actions) | set(new_actions):
+        if (verb, template) not in old_actions:
+            changes.append(('+', verb, template))
+        elif (verb, template) not in new_actions:
+            changes.append(('-', verb, template))
+        elif old_actions[verb, template] != new_actions[verb, template]:
+            changes.append(('~', verb, template))
+    return changes
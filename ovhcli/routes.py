@@ -0,0 +1,142 @@
+# -*- encoding: utf-8 -*-
+'''
+Compact route template index. Maps each API route template, for instance
+'/domain/zone/{zoneName}/record', to its HTTP verbs and parameters so that
+raw calls may be validated without loading the full parser tree.
+'''
+
+from ovhcli.schema import SCHEMAS_BASE_PATH
+from ovhcli.parser import ArgParserException, ArgParserUnknownRoute, intern_str
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+class RouteValidationError(ArgParserException): pass
+
+def get_route_index_path(endpoint):
+    return SCHEMAS_BASE_PATH+endpoint+'.routes'
+
+def build_route_index(schemas):
+    '''
+    Build route index from raw API schemas.
+
+    :param schemas: iterable of json API schemas
+    :return: dict of ``template: {verb: [(name, paramType, dataType, required)]}``
+    '''
+    index = {}
+    for schema in schemas:
+        if not 'resourcePath' in schema:
+            continue
+
+        for api in schema['apis']:
+            verbs = index.setdefault(intern_str(api['path']), {})
+            for operation in api['operations']:
+                verbs[intern_str(operation['httpMethod'].upper())] = [(
+                    intern_str(param.get('name')),
+                    intern_str(param.get('paramType')),
+                    intern_str(param.get('dataType')),
+                    bool(param.get('required', 0)),
+                ) for param in operation['parameters'] or []]
+    return index
+
+def save_route_index(endpoint, index):
+    with open(get_route_index_path(endpoint), 'w') as f:
+        pickle.dump(index, f, pickle.HIGHEST_PROTOCOL)
+
+def load_route_index(endpoint):
+    '''
+    :return: route index for ``endpoint`` or ``None`` if not built yet
+    '''
+    try:
+        with open(get_route_index_path(endpoint), 'r') as f:
+            return pickle.load(f)
+    except (IOError, EOFError, pickle.UnpicklingError):
+        return None
+
+def match_route(index, path):
+    '''
+    Find the route template matching concrete ``path``. When multiple
+    templates match, the one with the most literal chunks wins.
+
+    :return: matching template or ``None``
+    '''
+    chunks = path.split('?', 1)[0].strip('/').split('/')
+    best, best_score = None, -1
+
+    for template in index:
+        template_chunks = template.strip('/').split('/')
+        if len(template_chunks) != len(chunks):
+            continue
+
+        score = 0
+        for template_chunk, chunk in zip(template_chunks, chunks):
+            if template_chunk[0] == '{':
+                continue
+            if template_chunk != chunk:
+                break
+            score += 1
+        else:
+            if score > best_score:
+                best, best_score = template, score
+
+    return best
+
+def validate_call(index, verb, path, body):
+    '''
+    Check that ``verb`` on ``path`` exists and that ``body`` holds all required
+    parameters and only known ones.
+
+    :return: matching route template
+    :raise ArgParserUnknownRoute: when route or verb does not exist
+    :raise RouteValidationError: when parameters do not match
+    '''
+    template = match_route(index, path)
+    if template is None:
+        raise ArgParserUnknownRoute('Unknown route %s' % path)
+
+    if verb not in index[template]:
+        raise ArgParserUnknownRoute('No %s action on %s. Available: %s' % (
+            verb, template, ', '.join(sorted(index[template]))))
+
+    params = [param for param in index[template][verb] if param[1] != 'path']
+    body = body or {}
+
+    # a single 'body' parameter holds the whole object (PUT), fields are not
+    # part of the index
+    if len(params) == 1 and params[0][1] == 'body' and verb == 'PUT':
+        return template
+
+    known = set(param[0] for param in params)
+    unknown = [name for name in body if name not in known]
+    if unknown:
+        raise RouteValidationError('Unknown parameter(s) for %s %s: %s' % (
+            verb, template, ', '.join(sorted(unknown))))
+
+    missing = [name for name, _, _, required in params if required and name not in body]
+    if missing:
+        raise RouteValidationError('Missing parameter(s) for %s %s: %s' % (
+            verb, template, ', '.join(sorted(missing))))
+
+    return template
+
+def diff_route_index(old, new):
+    '''
+    Compare two route indexes.
+
+    :return: sorted list of ``(change, verb, template)`` where ``change`` is
+             '+' for new actions, '-' for removed ones and '~' when parameters
+             changed
+    '''
+    changes = []
+    for template in set(old) | set(new):
+        old_verbs, new_verbs = old.get(template, {}), new.get(template, {})
+        for verb in set(old_verbs) | set(new_verbs):
+            if verb not in old_verbs:
+                changes.append(('+', verb, template))
+            elif verb not in new_verbs:
+                changes.append(('-', verb, template))
+            elif old_verbs[verb] != new_verbs[verb]:
+                changes.append(('~', verb, template))
+    return sorted(changes, key=lambda change: (change[2], change[1]))
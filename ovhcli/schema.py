@@ -11,7 +11,7 @@ def do_get_schema(endpoint, name):
     Download and cache schema ``name`` in memory.
     '''
     if name in SCHEMAS:
-        return SCHEMAS['name']
+        return SCHEMAS[name]
 
     url = endpoint+name
 
@@ -22,8 +22,9 @@ def do_get_schema(endpoint, name):
 def load_schemas(endpoint):
     '''
     Download and installs json API schema for ``client`` and save them for
-    future use.
+    future use. Schemas from a previously loaded endpoint are dropped.
     '''
+    SCHEMAS.clear()
     root_schema = do_get_schema(endpoint, '/')
 
     for api in root_schema['apis']:
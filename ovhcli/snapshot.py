@@ -0,0 +1,191 @@
+# -*- encoding: utf-8 -*-
+'''
+Local inventory snapshot in SQLite.
+
+``sync`` stores expanded objects of top-level resources. Each new sync only
+fetches new IDs and a fraction of the oldest known ones, removed IDs are
+deleted. ``query`` and offline GETs are then answered from the snapshot.
+'''
+
+import json
+import math
+import time
+import urllib
+import sqlite3
+import argparse
+
+from threading import Lock
+
+from ovhcli.schema import SCHEMAS_BASE_PATH
+from ovhcli.expand import expand_listing, is_id_listing
+from ovhcli.utils import match_filters
+
+DEFAULT_STALE_FRACTION = 0.1
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS listings (
+    path TEXT PRIMARY KEY,
+    synced REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS objects (
+    path TEXT NOT NULL,
+    id TEXT NOT NULL,
+    id_json TEXT NOT NULL,
+    data TEXT NOT NULL,
+    synced REAL NOT NULL,
+    PRIMARY KEY (path, id)
+);
+'''
+
+class SnapshotMiss(Exception): pass
+
+def get_snapshot_path(endpoint):
+    return SCHEMAS_BASE_PATH+endpoint+'.sqlite'
+
+def parse_snapshot_args(prog, command, args):
+    parser = argparse.ArgumentParser(prog+' '+command)
+    parser.add_argument('resources', nargs='+', metavar='RESOURCE',
+                        help="top-level resource, for instance 'dedicated-server'")
+    parser.add_argument('--db', help='snapshot database (default: next to the parser cache)')
+    if command == 'sync':
+        parser.add_argument('--stale-fraction', type=float, default=DEFAULT_STALE_FRACTION,
+                            help='fraction of known objects to refresh, oldest first (default: %(default)s)')
+    else:
+        parser.add_argument('--where', action='append', default=[], metavar='KEY=VALUE',
+                            help='only keep objects matching all filters')
+    return parser.parse_args(args)
+
+def resolve_resources(parser, names):
+    '''
+    Map top-level command names to API paths, using the parser tree root.
+
+    :raise SnapshotMiss: on unknown resource
+    '''
+    paths = []
+    for name in names:
+        route = parser._routes.get(name)
+        if route is None or route.name is None:
+            raise SnapshotMiss('Unknown resource %s' % name)
+        paths.append('/'+route.path)
+    return paths
+
+class Snapshot(object):
+    def __init__(self, path):
+        self.lock = Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    ## sync
+
+    def sync(self, client, path, stale_fraction=DEFAULT_STALE_FRACTION, errors=None):
+        '''
+        Synchronize the listing at ``path``. A non-listing object is stored as
+        is, with an empty id.
+
+        Objects which could not be fetched are not stored, or keep their
+        previous value. The listing is then not marked as synced, so that an
+        incomplete first sync is not mistaken for the full listing offline.
+
+        :param list errors: ``(id, error)`` of failed GETs are appended to it
+        :return: added, removed, refreshed, unchanged, failed counts
+        '''
+        now = time.time()
+        data = client.get(path)
+
+        if not is_id_listing('GET', data):
+            with self.db:
+                self.db.execute('DELETE FROM objects WHERE path = ?', (path,))
+                self.store(path, [('', data)], now)
+                self.db.execute('INSERT OR REPLACE INTO listings VALUES (?, ?)', (path, now))
+            return 0, 0, 1, 0, 0
+
+        known = dict(self.db.execute('SELECT id, synced FROM objects WHERE path = ?', (path,)))
+        listed = dict((unicode(elem), elem) for elem in data)
+
+        added = [elem for key, elem in listed.iteritems() if key not in known]
+        removed = [key for key in known if key not in listed]
+        kept = sorted((synced, key) for key, synced in known.iteritems() if key in listed)
+        stale = [listed[key] for synced, key in kept[:int(math.ceil(len(kept)*stale_fraction))]]
+
+        failures = []
+        objects = expand_listing(client, path, added + stale, failures)
+        if errors is not None:
+            errors.extend(failures)
+
+        with self.db:
+            self.db.executemany('DELETE FROM objects WHERE path = ? AND id = ?',
+                                [(path, key) for key in removed])
+            self.store(path, objects, now)
+            if not failures:
+                self.db.execute('INSERT OR REPLACE INTO listings VALUES (?, ?)', (path, now))
+
+        failed = set(unicode(elem) for elem, error in failures)
+        added_count = len([elem for elem in added if unicode(elem) not in failed])
+        refreshed_count = len([elem for elem in stale if unicode(elem) not in failed])
+        return added_count, len(removed), refreshed_count, len(kept) - len(stale), len(failures)
+
+    def store(self, path, objects, now):
+        self.db.executemany('INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?)', [
+            (path, unicode(elem), json.dumps(elem), json.dumps(data), now)
+            for elem, data in objects
+        ])
+
+    ## query
+
+    def query(self, path, filters=None):
+        '''
+        :return: list of objects of listing ``path`` matching ``filters``
+        '''
+        with self.lock:
+            rows = self.db.execute('SELECT data FROM objects WHERE path = ? ORDER BY id', (path,)).fetchall()
+        objects = [json.loads(data) for data, in rows]
+        return [data for data in objects if match_filters(data, filters or [])]
+
+class SnapshotClient(object):
+    '''
+    Read-only client answering GETs from a snapshot.
+    '''
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def get(self, _target, _need_auth=True, **kwargs):
+        if kwargs:
+            raise SnapshotMiss('Filtered listings are not available offline: %s' % _target)
+
+        db, lock = self.snapshot.db, self.snapshot.lock
+        path = _target.rstrip('/')
+
+        with lock:
+            # a listing or a single object stored as is ?
+            if db.execute('SELECT 1 FROM listings WHERE path = ?', (path,)).fetchone():
+                rows = db.execute('SELECT id, id_json, data FROM objects WHERE path = ? ORDER BY id', (path,)).fetchall()
+                if len(rows) == 1 and rows[0][0] == '':
+                    return json.loads(rows[0][2])
+                return [json.loads(id_json) for _, id_json, _ in rows]
+
+            # an object of a listing ?
+            if '/' in path[1:]:
+                parent, elem = path.rsplit('/', 1)
+                row = db.execute('SELECT data FROM objects WHERE path = ? AND id = ?',
+                                 (parent, urllib.unquote_plus(elem).decode('utf-8'))).fetchone()
+                if row is not None:
+                    return json.loads(row[0])
+
+        raise SnapshotMiss('%s is not in the snapshot' % path)
+
+    def call(self, method, path, data=None, need_auth=True):
+        if method != 'GET':
+            raise SnapshotMiss('%s is not available offline' % method)
+        return self.get(path)
+
+    def post(self, _target, _need_auth=True, **kwargs):
+        return self.call('POST', _target)
+
+    def put(self, _target, _need_auth=True, **kwargs):
+        return self.call('PUT', _target)
+
+    def delete(self, _target, _need_auth=True):
+        return self.call('DELETE', _target)
@@ -0,0 +1,135 @@
+# -*- encoding: utf-8 -*-
+'''
+Content-addressed object store, shared across endpoints.
+
+Raw resource schemas and built command subtrees are stored once, zlib
+compressed, under the hash of their content. Per endpoint caches only keep
+keys. As most resources are identical between 'ovh-eu', 'ovh-ca',
+'kimsufi-eu', ... a new endpoint reuses whatever was already built.
+
+Objects are plain json, never pickles, so that a shared store can not be used
+to run code as another user. A tampered store may still alter commands and
+help, only share it between trusted users.
+
+The store defaults to a 'store' directory in the schema cache. Point
+``OVH_CLI_STORE`` to a common directory to share it between users of a host.
+New directories and objects get the permissions of the store directory, so a
+group of users may share it with::
+
+    mkdir /var/cache/ovh-cli && chgrp ovh /var/cache/ovh-cli
+    chmod 2775 /var/cache/ovh-cli
+
+Objects which can not be written to the shared store, for instance when it is
+read-only for this user, go to the default, private, store instead.
+'''
+
+import os
+import json
+import zlib
+import hashlib
+import tempfile
+
+from ovhcli.schema import SCHEMAS_BASE_PATH
+
+#: private store, also used when the shared one is not writable
+LOCAL_STORE_PATH = SCHEMAS_BASE_PATH+'store/'
+STORE_PATH = os.environ.get('OVH_CLI_STORE', LOCAL_STORE_PATH)
+
+def hash_content(data):
+    '''
+    Keys are not sorted as it would disable the fast json encoder. Identical
+    schemas are decoded with the same key order anyway and a different order
+    only means a cache miss.
+
+    :return: hash of json serializable ``data``
+    '''
+    return hashlib.sha1(json.dumps(data)).hexdigest()
+
+def get_store_paths():
+    '''
+    :return: store directories, in lookup order
+    '''
+    if STORE_PATH == LOCAL_STORE_PATH:
+        return [STORE_PATH]
+    return [STORE_PATH, LOCAL_STORE_PATH]
+
+def get_object_path(key, store_path=STORE_PATH):
+    # suffix tells json objects from the pickles of older versions
+    return os.path.join(store_path, key[:2], key[2:]+'.json.z')
+
+def get_store_mode(store_path):
+    '''
+    :return: permission bits of the store directory
+    '''
+    return os.stat(store_path).st_mode & 07777
+
+def load_object(key):
+    '''
+    :return: object stored under ``key`` or ``None`` if missing or unreadable
+    '''
+    for store_path in get_store_paths():
+        try:
+            with open(get_object_path(key, store_path), 'rb') as f:
+                return json.loads(zlib.decompress(f.read()))
+        except (IOError, zlib.error, ValueError):
+            pass
+    return None
+
+def save_object(key, data):
+    '''
+    Store json serializable ``data`` under ``key``, unless already there.
+    The first writable store is used.
+    '''
+    store_paths = get_store_paths()
+    for store_path in store_paths:
+        if os.path.exists(get_object_path(key, store_path)):
+            return
+
+    content = zlib.compress(json.dumps(data))
+    for store_path in store_paths:
+        if write_object(get_object_path(key, store_path), store_path, content):
+            return
+
+def write_object(path, store_path, content):
+    '''
+    Objects are written aside then renamed so that concurrent readers never
+    see partial objects.
+
+    :return: ``True`` on success
+    '''
+    directory = os.path.dirname(path)
+    tmp_path = None
+    try:
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass # created concurrently
+            else:
+                os.chmod(directory, get_store_mode(store_path))
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.chmod(tmp_path, get_store_mode(store_path) & 0666)
+        os.rename(tmp_path, path)
+        return True
+    except (IOError, OSError):
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return False
+
+def save_schema(schema):
+    '''
+    Store a raw resource schema. Its 'basePath' is endpoint specific and not
+    used, it is dropped so that identical resources share the same object.
+
+    :return: schema key
+    '''
+    schema = dict((name, value) for name, value in schema.iteritems() if name != 'basePath')
+    key = hash_content(schema)
+    save_object(key, schema)
+    return key
@@ -0,0 +1,125 @@
+# -*- encoding: utf-8 -*-
+'''
+Wait for asynchronous tasks returned by mutations.
+
+All tasks are polled from a single scheduler. Each task is polled with
+exponential backoff and jitter, until it reaches a final status or the global
+timeout expires.
+'''
+
+import sys
+import time
+import heapq
+import random
+
+from ovhcli.routes import match_route
+
+#: statuses after which a task will not change anymore
+DONE_STATUSES = ['done', 'finished']
+FAILED_STATUSES = ['cancelled', 'canceled', 'error', 'customerError', 'ovhError', 'problem', 'failed']
+
+INITIAL_DELAY = 1.0
+MAX_DELAY = 60.0
+DEFAULT_TIMEOUT = 3600
+
+def get_task_id(data):
+    '''
+    :return: task id if ``data`` looks like a task object, ``None`` otherwise
+    '''
+    if not isinstance(data, dict):
+        return None
+    if 'taskId' in data:
+        return data['taskId']
+    if 'id' in data and 'status' in data and ('function' in data or 'todoDate' in data):
+        return data['id']
+    return None
+
+def find_task_paths(index, method, data):
+    '''
+    Find tasks in mutation result ``data`` and locate their status path. Task
+    routes are looked up in the route ``index``, from ``method`` up to its
+    parents. For instance, '/dedicated/server/ns1/reboot' leads to
+    '/dedicated/server/ns1/task/42'.
+
+    :return: list of task paths
+    '''
+    items = data if isinstance(data, list) else [data]
+    task_ids = [task_id for task_id in (get_task_id(item) for item in items) if task_id is not None]
+    if not task_ids:
+        return []
+
+    prefix = method.split('?', 1)[0].rstrip('/')
+    while prefix:
+        path = '%s/task/%s' % (prefix, task_ids[0])
+        template = match_route(index, path)
+        if template is not None and 'GET' in index[template]:
+            return ['%s/task/%s' % (prefix, task_id) for task_id in task_ids]
+        prefix = prefix.rsplit('/', 1)[0]
+
+    return []
+
+class TaskWaiter(object):
+    '''
+    Single scheduler for many tasks, possibly on different clients.
+    '''
+    def __init__(self, timeout=DEFAULT_TIMEOUT, output=sys.stderr):
+        self.timeout = timeout
+        self.output = output
+        self.queue = [] #: heap of (next_poll, sequence, label, client, path, attempt, status)
+        self.sequence = 0
+
+    def __len__(self):
+        return len(self.queue)
+
+    def add(self, label, client, path):
+        self.schedule(time.time(), label, client, path, 0, None)
+
+    def schedule(self, when, label, client, path, attempt, status):
+        heapq.heappush(self.queue, (when, self.sequence, label, client, path, attempt, status))
+        self.sequence += 1
+
+    def report(self, label, path, message):
+        self.output.write('[%s] %s %s: %s\n' % (time.strftime('%H:%M:%S'), label, path, message))
+        self.output.flush()
+
+    def run(self):
+        '''
+        Poll until all tasks are finished or timeout is reached.
+
+        :return: exit code. 0 when all tasks are done
+        '''
+        deadline = time.time() + self.timeout
+        failed = 0
+
+        while self.queue:
+            when, _, label, client, path, attempt, status = heapq.heappop(self.queue)
+            if when > deadline:
+                heapq.heappush(self.queue, (when, 0, label, client, path, attempt, status))
+                break
+            delay = when - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            try:
+                task = client.get(path)
+                new_status = task.get('status') if isinstance(task, dict) else None
+            except Exception as e:
+                self.report(label, path, 'poll failed: %s' % e)
+                new_status = status
+
+            if new_status != status:
+                self.report(label, path, new_status)
+
+            if new_status in DONE_STATUSES:
+                continue
+            if new_status in FAILED_STATUSES:
+                failed += 1
+                continue
+
+            delay = min(MAX_DELAY, INITIAL_DELAY * 2**attempt) * random.uniform(0.5, 1.5)
+            self.schedule(time.time() + delay, label, client, path, attempt+1, new_status)
+
+        for _, _, label, client, path, _, status in self.queue:
+            self.report(label, path, 'timeout (last status: %s)' % status)
+
+        return 1 if failed or self.queue else 0
@@ -0,0 +1,75 @@
+# -*- encoding: utf-8 -*-
+'''
+On disk cache of the time delta between local and API clocks. Saves the
+'/auth/time' round trip on each invocation.
+'''
+
+import os
+import json
+import time
+import tempfile
+
+from ovhcli.schema import SCHEMAS_BASE_PATH
+
+#: seconds before the time delta is queried again
+TIME_DELTA_TTL = 6*3600
+
+#: API error codes meaning the request signature or timestamp was rejected
+TIME_ERROR_CODES = ['QUERY_TIME_OUT', 'INVALID_SIGNATURE']
+
+def get_time_delta_path(endpoint):
+    return SCHEMAS_BASE_PATH+endpoint+'.time'
+
+def load_time_delta(endpoint):
+    '''
+    :return: cached time delta for ``endpoint`` or ``None`` if missing or expired
+    '''
+    try:
+        with open(get_time_delta_path(endpoint), 'r') as f:
+            cache = json.load(f)
+        if cache['expires'] > time.time():
+            return int(cache['delta'])
+    except (IOError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+def save_time_delta(endpoint, delta):
+    '''
+    Cache ``delta`` for ``endpoint``. Write errors are ignored, the delta is
+    only queried again on next invocation.
+    '''
+    # write then rename so that concurrent invocations never read a partial file
+    tmp_path = None
+    try:
+        if not os.path.exists(SCHEMAS_BASE_PATH):
+            os.makedirs(SCHEMAS_BASE_PATH)
+
+        fd, tmp_path = tempfile.mkstemp(dir=SCHEMAS_BASE_PATH)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'delta': delta, 'expires': time.time() + TIME_DELTA_TTL}, f)
+        os.rename(tmp_path, get_time_delta_path(endpoint))
+    except (IOError, OSError):
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+def clear_time_delta(endpoint):
+    try:
+        os.remove(get_time_delta_path(endpoint))
+    except OSError:
+        pass
+
+def is_time_error(error):
+    '''
+    :return: ``True`` if API ``error`` is a rejected signature or timestamp,
+             which may be caused by a stale time delta
+    '''
+    response = getattr(error, 'response', None)
+    if response is None:
+        return False
+    try:
+        return response.json().get('errorCode') in TIME_ERROR_CODES
+    except (ValueError, AttributeError):
+        return False
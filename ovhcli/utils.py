@@ -1,6 +1,7 @@
 # -*- encoding: utf-8 -*-
 
 import re
+import urllib
 from itertools import izip
 
 def grouped(iterable, n):
@@ -9,6 +10,17 @@ def grouped(iterable, n):
     '''
     return izip(*[iter(iterable)]*n)
 
+def quote_chunk(value):
+    '''
+    Quote ``value`` as a single URL path chunk. Unicode is utf-8 encoded first
+    as ``urllib.quote_plus`` only supports byte strings.
+    '''
+    if not isinstance(value, basestring):
+        value = str(value)
+    elif isinstance(value, unicode):
+        value = value.encode('utf-8')
+    return urllib.quote_plus(value)
+
 def camel_to_snake(name):
     '''
     from: http://stackoverflow.com/questions/1175208/elegant-python-function-to-convert-camelcase-to-camel-case
@@ -45,3 +57,67 @@ def pretty_print_value_scalar(data):
     if isinstance(data, float):
         return "%.3f" % data
     return unicode(data)
+
+def pretty_print_value_dict(data):
+    # values ?
+    if sorted(data.keys()) == [u'unit', u'value']:
+        return u"%s%s" % (pretty_print_value_scalar(data['value']), data['unit'])
+    # prices
+    if sorted(data.keys()) == [u'currencyCode', u'text', u'value']:
+        return pretty_print_value_scalar(data['text'])
+    # fallback
+    else:
+        return str(data)
+
+def pretty_print_value_list(data):
+    # values ?
+    if data:
+        return ', '.join([pretty_print_value_scalar(x) for x in data])
+    # fallback
+    else:
+        return '<empty list>'
+
+def pretty_print_value(data):
+    if isinstance(data, (int, long, float)):
+        return pretty_print_value_scalar(data)
+    elif isinstance(data, dict):
+        return pretty_print_value_dict(data)
+    elif isinstance(data, list):
+        return pretty_print_value_list(data)
+    else:
+        return unicode(data)
+
+def get_field(data, name):
+    '''
+    Get field ``name`` from object ``data``. Nested fields are dot separated,
+    for instance 'price.value'. Returns ``None`` when missing.
+    '''
+    for chunk in name.split('.'):
+        if not isinstance(data, dict):
+            return None
+        data = data.get(chunk)
+    return data
+
+def parse_filters(filters):
+    '''
+    Parse a list of 'key=value' filters.
+
+    :return: list of ``(key, value)``
+    :raise ValueError: on invalid filter
+    '''
+    parsed = []
+    for item in filters:
+        if '=' not in item:
+            raise ValueError("Invalid filter '%s', expected 'key=value'" % item)
+        parsed.append(tuple(item.split('=', 1)))
+    return parsed
+
+def match_filters(data, filters):
+    '''
+    :return: ``True`` when all ``(key, value)`` filters match ``data``. Values
+             are compared as strings.
+    '''
+    for key, value in filters:
+        if unicode(get_field(data, key)) != value:
+            return False
+    return True
@@ -0,0 +1,166 @@
+# -*- encoding: utf-8 -*-
+'''
+Watch mode: re-poll a GET every few seconds, in the same process, and only
+report what changed.
+
+ID listings are re-read on each cycle. Added IDs are expanded right away,
+known ones are refreshed by rotation, ``REFRESH_FRACTION`` of them per cycle,
+least recently fetched first. On a terminal, the view is redrawn in place.
+Otherwise, only differences are printed, one per line.
+'''
+
+import sys
+import math
+import time
+import json
+
+from collections import OrderedDict
+
+from ovhcli.expand import expand_listing, is_id_listing
+from ovhcli.utils import pretty_print_value_scalar, quote_chunk
+
+CLEAR_SCREEN = '\033[H\033[2J'
+
+#: fraction of known listing objects fetched again on each cycle
+REFRESH_FRACTION = 0.25
+
+def poll(client, verb, method, arguments, previous=None, fetched=None, errors=None):
+    '''
+    Get current state. Listings are returned as an ``OrderedDict`` of
+    ``id: object``. Objects missing from ``previous`` state are fetched, as
+    well as the ``REFRESH_FRACTION`` least recently fetched known ones.
+
+    Objects which could not be fetched keep their previous value. New ones
+    are left out of the state, they are fetched again on next poll.
+
+    :param dict fetched: ``id: last fetch time``, updated in place
+    :param list errors: ``(id, error)`` of failed object GETs are appended to it
+    :return: listing flag, state
+    '''
+    data = getattr(client, verb.lower())(method, **arguments)
+    if not is_id_listing(verb, data):
+        return False, data
+
+    previous = previous if isinstance(previous, dict) else {}
+    fetched = fetched if fetched is not None else {}
+
+    added = [elem for elem in data if elem not in previous]
+    known = sorted((fetched.get(elem, 0), elem) for elem in data if elem in previous)
+    stale = [elem for _, elem in known[:int(math.ceil(len(known)*REFRESH_FRACTION))]]
+    objects = dict(expand_listing(client, method, added + stale,
+                                  errors if errors is not None else []))
+
+    listed = set(data)
+    for elem in fetched.keys():
+        if elem not in listed:
+            del fetched[elem]
+    now = time.time()
+    for elem in objects:
+        fetched[elem] = now
+
+    state = OrderedDict()
+    for elem in data:
+        if elem in objects:
+            state[elem] = objects[elem]
+        elif elem in previous:
+            state[elem] = previous[elem]
+    return True, state
+
+def diff_fields(old, new, prefix=''):
+    '''
+    :return: list of ``(field, old_value, new_value)``. Nested objects are
+             compared field by field, as 'parent.child'.
+    '''
+    changes = []
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in sorted(set(old) | set(new)):
+            changes += diff_fields(old.get(key), new.get(key), prefix+key+'.')
+    elif old != new:
+        changes.append((prefix[:-1] or 'value', old, new))
+    return changes
+
+def diff(listing, old, new):
+    '''
+    :return: list of change lines
+    '''
+    if not listing:
+        return ['~ %s: %s -> %s' % (field, format_value(before), format_value(after))
+                for field, before, after in diff_fields(old, new)]
+
+    old = old if isinstance(old, dict) else {}
+    lines = ['+ %s' % elem for elem in new if elem not in old]
+    lines += ['- %s' % elem for elem in old if elem not in new]
+    for elem in new:
+        if elem in old:
+            lines += ['~ %s %s: %s -> %s' % (elem, field, format_value(before), format_value(after))
+                      for field, before, after in diff_fields(old[elem], new[elem])]
+    return lines
+
+def format_value(data):
+    if isinstance(data, (dict, list)):
+        return json.dumps(data, sort_keys=True)
+    return pretty_print_value_scalar(data)
+
+class StateClient(object):
+    '''
+    Serve listing objects from watch state, so that formaters render a watched
+    listing, IDs included, exactly like a fresh one without fetching it again.
+    '''
+    def __init__(self, method, state):
+        self.objects = dict((method+'/'+quote_chunk(elem), data) for elem, data in state.iteritems())
+
+    def get(self, _target, _need_auth=True, **kwargs):
+        return self.objects[_target]
+
+def render(formater, client, verb, method, listing, state):
+    if listing:
+        formater.print_data(StateClient(method, state), verb, method, state.keys())
+    else:
+        formater.print_data(client, verb, method, state)
+
+def print_errors(now, errors):
+    for elem, error in errors:
+        print >>sys.stderr, (u'[%s] %s: %s' % (now, elem, error)).encode('utf-8')
+
+def watch(client, formater, verb, method, arguments, interval):
+    '''
+    Poll until interrupted. Errors are reported and polling goes on.
+
+    :return: exit code
+    '''
+    redraw = sys.stdout.isatty()
+    fetched = {}
+    errors = []
+    listing, state = poll(client, verb, method, arguments, fetched=fetched, errors=errors)
+    if redraw:
+        sys.stdout.write(CLEAR_SCREEN)
+    render(formater, client, verb, method, listing, state)
+    print_errors(time.strftime('%H:%M:%S'), errors)
+    sys.stdout.flush()
+
+    try:
+        while True:
+            time.sleep(interval)
+            now = time.strftime('%H:%M:%S')
+            errors = []
+            try:
+                listing, new_state = poll(client, verb, method, arguments, state, fetched, errors)
+            except Exception as e:
+                print >>sys.stderr, '[%s] %s' % (now, e)
+                continue
+            print_errors(now, errors)
+
+            changes = diff(listing, state, new_state)
+            state = new_state
+            if not changes:
+                continue
+
+            if redraw:
+                sys.stdout.write(CLEAR_SCREEN)
+                render(formater, client, verb, method, listing, state)
+                print
+            for line in changes:
+                print '[%s] %s' % (now, line)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        return 0